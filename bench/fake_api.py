@@ -0,0 +1,176 @@
+# -*- coding: UTF-8 -*-
+"""
+本地模拟的B站表情包接口，使用 list/ 中的数据回放 /x/emote/package、PackageDetail 与 AllPackages 的响应
+支持注入延迟、错误率与 412 限流，用于离线压测
+
+单独运行时在子进程中提供服务，启动后向标准输出打印一行 JSON（服务地址与最大ID），标准输入关闭时退出：
+    python bench/fake_api.py --list-dir list --latency 0.05
+GET /__records 返回已记录的请求
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'script'))
+
+from catalogue import load_packages  # noqa: E402
+
+RECORDS_PATH = '/__records'
+
+
+def to_api_package(package: dict) -> dict:
+    """
+    将 list/ 中的表情包还原为接口返回的格式（表情文本带方括号）
+    """
+    emotes = []
+    for emote in package.get('emote', []):
+        emote = dict(emote)
+        emote['text'] = f"[{emote['text']}]"
+        emotes.append(emote)
+    return {
+        'id': package['id'],
+        'text': package['text'],
+        'url': package['icon'],
+        'resource_type': package.get('resource_type', 0),
+        'emote': emotes,
+    }
+
+
+class FakeBiliApi:
+    """
+    模拟接口服务，在后台线程中运行
+    """
+
+    def __init__(self, list_dir='list', latency=0.0, jitter=0.0, error_rate=0.0, throttle_rps=0, seed=0):
+        """
+        :param list_dir: 表情包数据目录
+        :param latency: 每个请求的固定延迟（秒）
+        :param jitter: 在固定延迟上叠加的随机延迟上限（秒）
+        :param error_rate: 返回 HTTP 500 的概率
+        :param throttle_rps: 每秒请求数超过该值时返回 412，<= 0 表示不限流
+        :param seed: 随机数种子
+        """
+        self.ambiguous = {}  # 存在多个文件的ID不回放；不打印警告，标准输出留给子进程的启动信息
+        self.packages = {package['id']: to_api_package(package) for package in load_packages(list_dir, self.ambiguous)}
+        self.sorted_ids = sorted(self.packages)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rps = throttle_rps
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window = (0, 0)  # (当前秒, 本秒内请求数)
+        self.records = []  # (路径, HTTP 状态码, 耗时, 响应字节数, 到达时间)
+        self.server = None
+
+    def _throttled(self) -> bool:
+        if self.throttle_rps <= 0:
+            return False
+        with self.lock:
+            second = int(time.monotonic())
+            count = self.window[1] + 1 if self.window[0] == second else 1
+            self.window = (second, count)
+            return count > self.throttle_rps
+
+    def _should_fail(self) -> bool:
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+    def handle(self, path: str, query: dict) -> tuple:
+        """
+        :return: (HTTP 状态码, 响应 JSON)
+        """
+        if self._throttled():
+            return 412, {'code': -412, 'message': '请求被拦截'}
+        if self._should_fail():
+            return 500, {'code': -500, 'message': '服务器错误'}
+
+        if path == '/x/emote/package':
+            ids = [int(i) for i in query.get('ids', [''])[0].split(',') if i]
+            packages = [self.packages[i] for i in ids if i in self.packages]
+            return 200, {'code': 0, 'message': '0', 'data': {'packages': packages or None}}
+        if path.endswith('EmoteService/PackageDetail'):
+            package = self.packages.get(int(query.get('id', ['0'])[0]))
+            if package is None:
+                return 200, {'code': 0, 'message': '0', 'data': {}}
+            detail = dict(package)
+            detail['emotes'] = detail.pop('emote')
+            return 200, {'code': 0, 'message': '0', 'data': {'package': detail}}
+        if path.endswith('EmoteService/AllPackages'):
+            pn = int(query.get('pn', ['1'])[0])
+            ps = int(query.get('ps', ['100'])[0])
+            page = self.sorted_ids[(pn - 1) * ps:pn * ps]
+            packages = [{'id': id_, 'text': self.packages[id_]['text']} for id_ in page]
+            return 200, {'code': 0, 'message': '0', 'data': {'total': len(self.sorted_ids), 'packages': packages}}
+        return 404, {'code': -404, 'message': '啥都木有'}
+
+    def start(self, port=0) -> str:
+        """
+        启动服务
+        :param port: 端口，0 表示自动分配
+        :return: 服务地址，可作为 API_BASE
+        """
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                start = time.monotonic()
+                url = urllib.parse.urlsplit(self.path)
+                if url.path == RECORDS_PATH:  # 不计入记录，也不受限流与错误注入影响
+                    with api.lock:
+                        records = list(api.records)
+                    self._send(200, records)
+                    return
+                status, body = api.handle(url.path, urllib.parse.parse_qs(url.query))
+                delay = api.latency + (api.random.random() * api.jitter if api.jitter else 0)
+                if delay:
+                    time.sleep(delay)
+                data = self._send(status, body)
+                with api.lock:
+                    api.records.append((url.path, status, time.monotonic() - start, len(data), start))
+
+            def _send(self, status: int, body) -> bytes:
+                data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                return data
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='在独立进程中运行模拟接口')
+    parser.add_argument('--list-dir', default='list', help='回放数据目录')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求的固定延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='随机延迟上限（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回 HTTP 500 的概率')
+    parser.add_argument('--throttle-rps', type=int, default=0, help='每秒请求数超过该值时返回 412')
+    parser.add_argument('--port', type=int, default=0, help='端口，0 表示自动分配')
+    args = parser.parse_args()
+
+    api = FakeBiliApi(args.list_dir, args.latency, args.jitter, args.error_rate, args.throttle_rps)
+    print(json.dumps({'url': api.start(args.port), 'max_id': api.sorted_ids[-1] if api.sorted_ids else 0}), flush=True)
+    sys.stdin.read()  # 父进程退出或关闭管道时停止
+    api.stop()
@@ -0,0 +1,166 @@
+# -*- coding: UTF-8 -*-
+"""
+离线压测：在本地模拟接口上运行扫描器，输出吞吐量、请求耗时分位数、峰值内存与写入文件数
+模拟接口运行在独立的子进程中，不占用扫描器进程的内存与 GIL
+
+用法：
+    python bench/run_bench.py --engine main_new --latency 0.05 --error-rate 0.01 --throttle-rps 200
+"""
+import argparse
+import importlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'script'))
+
+from fake_api import RECORDS_PATH  # noqa: E402
+
+
+ENGINES = {
+    'main': ('main', 'main'),  # 批量接口，自适应批量大小
+    'main_new': ('main_new', 'main'),  # PackageDetail，多线程
+    'main_new_async': ('main_new', 'main_async'),  # PackageDetail，asyncio
+}
+
+
+class FakeAuth:
+    """
+    不连接 MongoDB 的认证模块
+    """
+
+    def has_access(self, mid):
+        return True
+
+    def get_access(self, mid):
+        return 'bench_access_key', 'bench_cookie'
+
+
+class ApiProcess:
+    """
+    在子进程中运行的模拟接口（bench/fake_api.py）
+    """
+
+    def __init__(self, list_dir, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rps=0):
+        """
+        参数与 FakeBiliApi 相同，启动子进程并等待其打印服务地址
+        """
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, 'bench', 'fake_api.py'), '--list-dir', list_dir,
+             '--latency', str(latency), '--jitter', str(jitter), '--error-rate', str(error_rate),
+             '--throttle-rps', str(throttle_rps)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        while True:  # 启动信息之前的输出（如警告）直接跳过
+            line = self.process.stdout.readline()
+            if not line:
+                raise RuntimeError(f'模拟接口启动失败，退出码 {self.process.wait()}')
+            try:
+                info = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(info, dict) and 'url' in info:
+                break
+        self.url = info['url']
+        self.max_id = info['max_id']
+
+    @property
+    def records(self) -> list:
+        """
+        :return: 子进程记录的请求 (路径, HTTP 状态码, 耗时, 响应字节数, 到达时间)
+        """
+        with urllib.request.urlopen(self.url + RECORDS_PATH) as response:
+            return json.load(response)
+
+    def stop(self):
+        self.process.stdin.close()  # 子进程在标准输入关闭后退出
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def run(engine: str, api: ApiProcess, scan_config: dict) -> dict:
+    """
+    在临时目录中运行一次扫描
+    :param engine: ENGINES 中的引擎名
+    :param api: 已启动的模拟接口
+    :param scan_config: 扫描配置
+    :return: 压测结果
+    """
+    module_name, method = ENGINES[engine]
+    module = importlib.import_module(module_name)
+    os.environ['SCAN_CONFIG'] = json.dumps(scan_config)  # 重试、冷却、缓存等配置在构造时读取
+    emoji = module.BiliEmoji(auth=FakeAuth())
+
+    start = time.monotonic()
+    getattr(emoji, method)()
+    elapsed = time.monotonic() - start
+
+    records = api.records
+    latencies = [record[2] for record in records]
+    statuses = {}
+    for record in records:
+        statuses[str(record[1])] = statuses.get(str(record[1]), 0) + 1
+    saved = sum(emoji.WRITER.counts.values())
+    return {
+        'engine': engine,
+        'seconds': round(elapsed, 3),
+        'packages': saved,
+        'packages_per_sec': round(saved / elapsed, 1) if elapsed else 0.0,
+        'requests': len(records),
+        'status': statuses,
+        'latency_p50_ms': round(percentile(latencies, 50) * 1000, 2),  # 服务端测得，包含注入的延迟
+        'latency_p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'bytes': sum(record[3] for record in records),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'files_written': emoji.WRITER.counts['added'] + emoji.WRITER.counts['changed'],
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='在本地模拟接口上压测扫描器')
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='main_new', help='扫描引擎')
+    parser.add_argument('--list-dir', default=os.path.join(ROOT, 'list'), help='回放数据目录')
+    parser.add_argument('--start', type=int, default=1, help='起始ID')
+    parser.add_argument('--end', type=int, default=0, help='结束ID，默认为数据中的最大ID')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求的固定延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='随机延迟上限（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回 HTTP 500 的概率')
+    parser.add_argument('--throttle-rps', type=int, default=0, help='每秒请求数超过该值时返回 412')
+    parser.add_argument('--scan-config', default='{}', help='额外的扫描配置（JSON），覆盖默认值')
+    parser.add_argument('--output', help='将结果追加写入该文件（JSON Lines）')
+    args = parser.parse_args()
+
+    api = ApiProcess(os.path.abspath(args.list_dir), args.latency, args.jitter, args.error_rate, args.throttle_rps)
+    os.environ['API_BASE'] = api.url
+    config = {'start': args.start, 'end': args.end or api.max_id, 'step': 40, 'ignore': []}
+    config.update(json.loads(args.scan_config))
+
+    output = os.path.abspath(args.output) if args.output else None
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)  # 扫描结果写入临时目录，不影响仓库中的 list/
+        os.environ['SCAN_STATE'] = os.path.join(work_dir, 'scan_state.json')
+        try:
+            result = run(args.engine, api, config)
+        finally:
+            os.chdir(ROOT)
+            api.stop()
+
+    result['config'] = {key: value for key, value in vars(args).items() if key not in ('list_dir', 'output')}
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if output:
+        with open(output, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(result, ensure_ascii=False) + '\n')
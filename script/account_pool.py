@@ -0,0 +1,119 @@
+# -*- coding: UTF-8 -*-
+import threading
+import time
+
+from metrics import METRICS
+from rate_limit import TokenBucket
+
+AUTH_CODES = {-2, -101, -658}  # access_key 错误、账号未登录、access_key 已过期
+
+
+class NoAccountAvailable(Exception):
+    """
+    账号池中没有可用的账号
+    """
+
+
+class Account:
+    """
+    账号池中的单个账号
+    """
+
+    def __init__(self, mid, access_key, cookie, rps):
+        """
+        :param mid: 用户的 mid
+        :param access_key: access_token
+        :param cookie: cookie 字符串
+        :param rps: 该账号每秒请求数上限，<= 0 表示不限速
+        """
+        self.mid = mid
+        self.access_key = access_key
+        self.cookie = cookie
+        self.bucket = TokenBucket(rps)
+        self.paused_until = 0.0  # 被限流后暂停使用到该时间
+        self.refreshed = False  # 本次运行中是否已因认证错误刷新过
+        self.removed = False  # 刷新后仍认证失败，不再使用
+
+
+class AccountPool:
+    """
+    账号池：认证请求按轮询分配到多个账号，每个账号有独立的令牌桶
+    账号被限流时暂停使用一段时间；认证失败时刷新一次 access_token，仍失败则移出轮询
+    """
+
+    def __init__(self, auth, mids, rps=2.0, cooldown=300.0):
+        """
+        加载账号，获取失败的账号会被跳过
+        :param auth: 认证模块，需提供 get_access(mid) 与 refresh(mid)
+        :param mids: 账号 mid 列表
+        :param rps: 每个账号每秒请求数上限
+        :param cooldown: 账号被限流后暂停使用的秒数
+        """
+        self.auth = auth
+        self.cooldown = cooldown
+        self.accounts = []
+        self.cursor = 0
+        self.lock = threading.Lock()
+        for mid in mids:
+            try:
+                access_key, cookie = auth.get_access(mid)
+            except Exception as e:
+                print(f"[WARN] 账号 {mid} 加载失败: {e}")
+                continue
+            self.accounts.append(Account(mid, access_key, cookie, rps))
+
+    def __len__(self):
+        """
+        :return: 当前可用的账号数
+        """
+        now = time.monotonic()
+        return sum(1 for account in self.accounts if not account.removed and account.paused_until <= now)
+
+    def acquire(self) -> Account:
+        """
+        轮询取出下一个可用账号，并等待该账号的令牌
+        所有账号都被限流暂停时等待最早恢复的账号
+        :return: 账号
+        """
+        while True:
+            with self.lock:
+                candidates = [account for account in self.accounts if not account.removed]
+                if not candidates:
+                    raise NoAccountAvailable('账号池中没有可用的账号')
+                now = time.monotonic()
+                active = [account for account in candidates if account.paused_until <= now]
+                if active:
+                    account = active[self.cursor % len(active)]
+                    self.cursor += 1
+                    break
+                delay = min(account.paused_until for account in candidates) - now
+            time.sleep(delay)
+        account.bucket.acquire()
+        return account
+
+    def report_throttle(self, account: Account):
+        """
+        账号被限流，暂停使用 cooldown 秒
+        """
+        account.paused_until = time.monotonic() + self.cooldown
+        METRICS.inc('account_throttles', mid=str(account.mid))
+        print(f"[WARN] 账号 {account.mid} 被限流，暂停使用 {self.cooldown:.0f} 秒")
+
+    def report_auth_error(self, account: Account):
+        """
+        账号认证失败：首次失败时刷新 access_token，刷新失败或再次认证失败时移出轮询
+        """
+        METRICS.inc('account_auth_errors', mid=str(account.mid))
+        with self.lock:
+            if account.removed:
+                return
+            if not account.refreshed:
+                account.refreshed = True
+                try:
+                    account.access_key, account.cookie = self.auth.refresh(account.mid)
+                    print(f"[INFO] 账号 {account.mid} 认证失败，已刷新 access_token")
+                    return
+                except Exception as e:
+                    print(f"[WARN] 账号 {account.mid} 刷新 access_token 失败: {e}")
+            account.removed = True
+        print(f"[WARN] 账号 {account.mid} 认证失败，已移出账号池")
@@ -0,0 +1,50 @@
+# -*- coding: UTF-8 -*-
+import threading
+
+
+class AdaptiveBatchSizer:
+    """
+    根据响应耗时、错误率与响应体大小自适应调整批量请求的大小（加性增、乘性减）
+    多线程并发调用是安全的
+    """
+
+    def __init__(self, initial=40, minimum=5, maximum=40, target_latency=2.0, max_bytes=2 * 1024 * 1024):
+        """
+        初始化批量大小调节器
+        :param initial: 初始批量大小
+        :param minimum: 最小批量大小
+        :param maximum: 最大批量大小
+        :param target_latency: 目标响应耗时（秒），超过则缩小批量
+        :param max_bytes: 单次响应体大小上限（字节），超过则缩小批量
+        """
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.size = min(self.maximum, max(self.minimum, initial))
+        self.target_latency = target_latency
+        self.max_bytes = max_bytes
+        self.error_rate = 0.0  # 错误率的指数滑动平均
+        self.lock = threading.Lock()
+
+    def next_size(self) -> int:
+        """
+        :return: 下一批请求应使用的大小
+        """
+        with self.lock:
+            return self.size
+
+    def observe(self, size: int, latency: float, ok: bool, nbytes: int = 0):
+        """
+        记录一次批量请求的结果并调整批量大小
+        :param size: 该批请求的ID数量
+        :param latency: 响应耗时（秒）
+        :param ok: 请求是否成功
+        :param nbytes: 响应体大小（字节）
+        """
+        with self.lock:
+            self.error_rate = self.error_rate * 0.8 + (0.0 if ok else 0.2)
+            if not ok:
+                self.size = max(self.minimum, min(self.size, size) // 2)
+            elif latency > self.target_latency or nbytes > self.max_bytes:
+                self.size = max(self.minimum, int(self.size * 0.75))
+            elif self.error_rate < 0.1 and size >= self.size:  # 只有满批且近期稳定时才增大
+                self.size = min(self.maximum, self.size + max(1, self.size // 4))
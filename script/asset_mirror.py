@@ -0,0 +1,183 @@
+# -*- coding: UTF-8 -*-
+import argparse
+import concurrent.futures
+import hashlib
+import os
+import re
+import threading
+import time
+
+import requests
+from requests.exceptions import RequestException
+
+from catalogue import load_packages
+from retry_policy import RetryPolicy, parse_retry_after
+
+BFS_HASH = re.compile(r'/bfs/emote/([0-9a-f]{40})(\.\w+)?')
+
+
+def asset_key(url: str) -> str:
+    """
+    计算图片在内容寻址存储中的文件名
+    B站图片地址中已经包含内容哈希（/bfs/emote/<sha1>.<ext>），直接使用；否则使用地址的 sha1
+    :param url: 图片地址
+    :return: 文件名，例如 aadaca1895e09c5596fc6365192ec93a23718cf0.png
+    """
+    match = BFS_HASH.search(url)
+    if match:
+        return match.group(1) + (match.group(2) or '')
+    ext = os.path.splitext(url.split('?', 1)[0])[1]
+    return hashlib.sha1(url.encode()).hexdigest() + ext
+
+
+def file_sha1(path: str) -> str:
+    """
+    :param path: 文件路径
+    :return: 文件内容的 sha1
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def collect_asset_urls(packages: list, fields=('url', 'gif_url', 'webp_url')) -> dict:
+    """
+    收集所有表情包中的图片地址并按内容去重
+    :param packages: 表情包字典列表
+    :param fields: 需要镜像的字段
+    :return: {文件名: 图片地址}
+    """
+    assets = {}
+    for package in packages:
+        if 'url' in fields:  # 表情包图标
+            assets.setdefault(asset_key(package['icon']), package['icon'])
+        for emote in package.get('emote', []):
+            for field in fields:
+                if field in emote:
+                    assets.setdefault(asset_key(emote[field]), emote[field])
+    return assets
+
+
+class AssetMirror:
+    """
+    内容寻址的图片镜像：每个图片只下载一次，存放在 <store_dir>/<哈希前两位>/<文件名>
+    下载中断的文件保存为 .part，下次运行时通过 Range 请求续传
+    B站图片地址中带有内容哈希，下载完成后先校验 .part 的 sha1，不一致时删除并重新下载，避免错误的文件进入存储
+    """
+
+    def __init__(self, store_dir='assets', workers=16, retry: RetryPolicy = None, timeout=30):
+        """
+        初始化镜像
+        :param store_dir: 存储目录
+        :param workers: 并发下载数
+        :param retry: 重试策略，决定单个文件的最大尝试次数与重试间隔，默认为 RetryPolicy()
+        :param timeout: 单次请求超时时间（秒）
+        """
+        self.store_dir = store_dir
+        self.workers = workers
+        self.retry = retry or RetryPolicy()
+        self.timeout = timeout
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.counts = {'downloaded': 0, 'skipped': 0, 'failed': 0}
+
+    def path(self, key: str) -> str:
+        """
+        :param key: 文件名
+        :return: 文件在存储中的路径
+        """
+        return os.path.join(self.store_dir, key[:2], key)
+
+    def get_thread_session(self):
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def _count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def download(self, key: str, url: str) -> bool:
+        """
+        下载单个图片，已存在时跳过，存在 .part 文件时续传，完成后校验内容哈希
+        :param key: 文件名
+        :param url: 图片地址
+        :return: 文件是否已在存储中
+        """
+        path = self.path(key)
+        if os.path.exists(path):
+            self._count('skipped')
+            return True
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        part_path = f'{path}.part'
+        session = self.get_thread_session()
+        match = BFS_HASH.search(url)
+        expected = match.group(1) if match else None  # 只有 B站图片地址带有内容哈希
+
+        for attempt in range(self.retry.attempts):
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            headers = {'Range': f'bytes={offset}-'} if offset else {}
+            retry_after = None
+            try:
+                with session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    if response.status_code == 416:  # 按 .part 的长度已无可续传的内容，是否完整由哈希校验判断
+                        pass
+                    elif response.status_code in (200, 206):
+                        mode = 'ab' if response.status_code == 206 else 'wb'  # 服务端不支持 Range 时从头下载
+                        with open(part_path, mode) as f:
+                            for chunk in response.iter_content(chunk_size=64 * 1024):
+                                f.write(chunk)
+                    elif self.retry.classify(response.status_code, 0) == 'permanent':
+                        print(f"[ERROR] 图片 {url} 下载失败: HTTP {response.status_code}")
+                        break
+                    else:
+                        raise RequestException(f"HTTP {response.status_code}")
+                if expected and file_sha1(part_path) != expected:
+                    os.remove(part_path)  # 续传的前半部分或服务端返回的内容有误，下次从头下载
+                    raise ValueError('内容哈希不一致')
+                os.replace(part_path, path)
+                self._count('downloaded')
+                return True
+            except (RequestException, OSError, ValueError) as e:
+                print(f"[WARN] 图片 {url} 下载失败，重试 {attempt + 1}/{self.retry.attempts}，错误: {e}")
+                if attempt + 1 < self.retry.attempts:
+                    time.sleep(self.retry.backoff(attempt, retry_after))
+        self._count('failed')
+        return False
+
+    def mirror(self, assets: dict):
+        """
+        并发下载所有尚未存储的图片
+        :param assets: {文件名: 图片地址}
+        """
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self.download, key, url) for key, url in assets.items()]
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"[ERROR] 线程任务失败: {e}")
+
+    def summary(self) -> str:
+        """
+        :return: 本次运行的下载统计
+        """
+        return f"下载 {self.counts['downloaded']}，已存在 {self.counts['skipped']}，失败 {self.counts['failed']}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='镜像表情包图片到内容寻址存储')
+    parser.add_argument('--list-dir', default='list', help='表情包输出目录')
+    parser.add_argument('--store', default=os.getenv('ASSET_DIR', 'assets'), help='图片存储目录')
+    parser.add_argument('--workers', type=int, default=16, help='并发下载数')
+    parser.add_argument('--fields', default='url,gif_url,webp_url', help='需要镜像的字段，逗号分隔')
+    args = parser.parse_args()
+
+    assets = collect_asset_urls(load_packages(args.list_dir), tuple(args.fields.split(',')))
+    print(f"[INFO] 共 {len(assets)} 个不重复的图片")
+    asset_mirror = AssetMirror(args.store, args.workers)
+    asset_mirror.mirror(assets)
+    print(f"[INFO] 镜像完成: {asset_mirror.summary()}")
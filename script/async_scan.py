@@ -0,0 +1,138 @@
+# -*- coding: UTF-8 -*-
+import asyncio
+import json
+import time
+
+import aiohttp
+
+from http_cache import cache_key
+from metrics import METRICS
+from rate_limit import TokenBucket
+from retry_policy import parse_retry_after
+
+
+class AsyncScanner:
+    """
+    基于 asyncio 的表情包扫描器，复用 BiliEmoji 的请求构造，获取到的数据交给 BiliEmoji 的流水线解析与保存
+    """
+
+    def __init__(self, emoji, concurrency=50, rps=0, retry=None, timeout=10):
+        """
+        初始化扫描器
+        :param emoji: BiliEmoji 实例，提供 _build_detail_request、流水线 PIPELINE、
+                      扫描状态 STATE、扫描断点 CHECKPOINT 以及重试策略 RETRY、熔断器 BREAKER 与失败队列 RETRY_QUEUE
+        :param concurrency: 同时在途的请求数上限
+        :param rps: 每秒请求数上限，<= 0 表示不限速
+        :param retry: 单个ID的最大尝试次数，默认使用重试策略的配置
+        :param timeout: 单次请求超时时间（秒）
+        """
+        self.emoji = emoji
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rps)
+        self.retry = retry
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.semaphore = None
+
+    async def fetch_package(self, session, id):
+        """
+        获取单个表情包的原始数据
+        :param session: 共享的 aiohttp.ClientSession
+        :param id: 表情包ID
+        :return: 接口返回的表情包数据；不存在或失败时返回 None
+        """
+        fetch_start = time.monotonic()  # 首次取得并发槽位时重置，get_emoji_info_seconds 不计排队时间
+        try:
+            url, sign_params, headers = self.emoji._build_detail_request(id)
+            policy, breaker, cache = self.emoji.RETRY, self.emoji.BREAKER, self.emoji.HTTP_CACHE
+            attempts = self.retry or policy.attempts
+            key = cache_key('PackageDetail', sign_params) if cache else None
+            entry = cache.get(key) if cache else None
+            if entry and cache.is_fresh(entry):
+                METRICS.inc('http_cache', endpoint='PackageDetail', result='hit')
+                return self._package(id, json.loads(entry.body))
+            if entry:
+                headers = dict(headers, **cache.conditional_headers(entry))
+            for attempt in range(attempts):
+                retry_after = None
+                res = None
+                try:
+                    async with self.semaphore:
+                        if attempt == 0:
+                            fetch_start = time.monotonic()
+                        await breaker.wait_async()  # 取得并发槽位后再检查熔断，排队中的协程在熔断期间不会继续发送
+                        await self.bucket.acquire_async()  # 在发送前才取令牌，排队期间不消耗令牌，延迟下降时不会集中发出积压的请求
+                        start = time.monotonic()  # request_seconds 只计请求本身，不含排队、熔断与限速等待
+                        async with session.get(url, params=sign_params, headers=headers) as response:
+                            status = response.status
+                            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                            body = await response.read()
+                    if entry and status == 304:  # 缓存仍有效
+                        cache.refresh(key)
+                        METRICS.inc('http_cache', endpoint='PackageDetail', result='revalidated')
+                        METRICS.record_request('PackageDetail', status, None, 0, time.monotonic() - start)
+                        breaker.record_success()
+                        return self._package(id, json.loads(entry.body))
+                    try:
+                        res = json.loads(body)
+                    except ValueError:
+                        pass
+                    code = res.get('code') if isinstance(res, dict) else None
+                    METRICS.record_request('PackageDetail', status, code, len(body), time.monotonic() - start)
+                    kind = policy.classify(status, code)
+                    reason = f"HTTP {status}, code {code}"
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    METRICS.record_request('PackageDetail', 'error', None, 0, time.monotonic() - start)
+                    kind, reason = 'transient', e
+
+                if kind == 'ok':
+                    breaker.record_success()
+                    if cache:
+                        changed = cache.put(key, body, response.headers)
+                        result = 'miss' if entry is None else ('changed' if changed else 'unchanged')
+                        METRICS.inc('http_cache', endpoint='PackageDetail', result=result)
+                    return self._package(id, res)
+                if kind == 'permanent':
+                    message = res.get('message') if isinstance(res, dict) else reason
+                    print(f"[ERROR] 表情包ID {id} 获取失败: {message}")
+                    return None
+                if kind == 'throttle':
+                    breaker.record_throttle(retry_after)
+                print(f"[WARN] 获取ID {id} 失败，重试 {attempt + 1}/{attempts}，错误: {reason}")
+                METRICS.inc('retries', endpoint='PackageDetail')
+                await asyncio.sleep(policy.backoff(attempt, retry_after))
+            self.emoji.RETRY_QUEUE.add(id)
+            return None
+        finally:
+            METRICS.observe('get_emoji_info_seconds', time.monotonic() - fetch_start)
+
+    def _package(self, id, res):
+        """
+        :param res: PackageDetail 的响应
+        :return: 响应中的表情包数据；不存在时记录为空并返回 None
+        """
+        package = res.get('data', {}).get('package')
+        if not package:
+            self.emoji.STATE.record_empty(id)
+            return None
+        return package
+
+    async def _worker(self, session, id):
+        package = await self.fetch_package(session, id)
+        if package:
+            await asyncio.to_thread(self.emoji.PIPELINE.put, id, package)  # 流水线队列已满时等待，不阻塞事件循环
+        elif id not in self.emoji.RETRY_QUEUE:  # 确认不存在
+            self.emoji.CHECKPOINT.mark_done(id)
+
+    async def run(self, ids):
+        """
+        并发扫描给定的表情包ID
+        :param ids: 表情包ID列表
+        """
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300)
+        async with aiohttp.ClientSession(connector=connector, timeout=self.timeout,
+                                         trust_env=True) as session:
+            results = await asyncio.gather(*(self._worker(session, id_) for id_ in ids), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"[ERROR] 协程任务失败: {result}")
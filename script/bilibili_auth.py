@@ -1,14 +1,20 @@
 # -*- coding: UTF-8 -*-
 import os
+import json
 import time
 import urllib.parse
 import hashlib
 from datetime import datetime
-import pymongo
 import requests
-import certifi
 
+from metrics import METRICS
+from output import atomic_write
 
+REFRESH_DAYS = 14  # access_token 超过该天数未更新时刷新
+DB_TIMEOUT_MS = 5000  # 数据库不可达时的等待上限，避免卡住扫描
+
+
+@METRICS.timed('appsign_seconds')
 def appsign(params, appkey, appsec):
     """
     对请求参数进行签名
@@ -38,22 +44,69 @@ class BilibiliAuth:
     """
     Bilibili 认证类，用于管理账号的 access_token 和 cookie
     """
-    def __init__(self, db_uri=None):
+    def __init__(self, db_uri=None, client=None, cache_path=None):
+        """
+        初始化 BilibiliAuth 实例，数据库连接在首次使用时才建立
+        :param db_uri: 数据库连接 URI，默认为环境变量 ACCOUNT_DB_URI，均未设置时使用本机数据库
+        :param client: 已创建的 MongoClient 或兼容对象（例如 mongomock.MongoClient），传入时不再连接 db_uri
+        :param cache_path: 本地凭据缓存文件，默认为环境变量 CREDENTIAL_CACHE 或 .credential_cache.json，空字符串表示不缓存
+        """
+        self.db_configured = client is not None or bool(db_uri or os.getenv('ACCOUNT_DB_URI'))
+        self.db_uri = db_uri or os.getenv('ACCOUNT_DB_URI', 'mongodb://localhost:27017/')
+        self._client = client
+        self.cache_path = os.getenv('CREDENTIAL_CACHE', '.credential_cache.json') if cache_path is None else cache_path
+
+    @property
+    def MONGO_CLIENT(self):
+        if self._client is None:
+            import certifi
+            import pymongo  # 只在需要查询数据库时导入并连接
+            self._client = pymongo.MongoClient(self.db_uri, tlsCAFile=certifi.where(),
+                                               serverSelectionTimeoutMS=DB_TIMEOUT_MS, connectTimeoutMS=DB_TIMEOUT_MS)
+        return self._client
+
+    def _load_cache(self) -> dict:
+        """
+        :return: 本地凭据缓存 {mid: {'access_key', 'cookie', 'expires'}}，文件不存在或损坏时返回空字典
+        """
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except ValueError:
+            return {}
+
+    def _save_cache(self, mid, access_key, cookie_str, expires):
+        """
+        将凭据写入本地缓存，文件权限为 0600
+        :param expires: 缓存过期的时间戳
+        """
+        if not self.cache_path:
+            return
+        cache = self._load_cache()
+        cache[str(mid)] = {'access_key': access_key, 'cookie': cookie_str, 'expires': int(expires)}
+        atomic_write(self.cache_path, json.dumps(cache).encode('utf-8'), mode=0o600)
+
+    def has_access(self, mid) -> bool:
         """
-        初始化 BilibiliAuth 实例
-        :param db_uri: 数据库连接 URI，默认为环境变量 ACCOUNT_DB_URI
+        :param mid: 用户的 mid
+        :return: 本地缓存中有未过期的凭据，或配置了数据库时返回 True
         """
-        self.MONGO_CLIENT = pymongo.MongoClient(
-            db_uri or os.getenv('ACCOUNT_DB_URI', 'mongodb://localhost:27017/'),
-            tlsCAFile=certifi.where()
-        )
+        cached = self._load_cache().get(str(mid))
+        return self.db_configured or bool(cached and cached['expires'] > time.time())
 
     def get_access(self, mid):
         """
         获取指定用户的 access_token 和 cookie
+        优先使用本地缓存，缓存过期（到达刷新时间或 token 过期）后才查询数据库
         :param mid: 用户的 mid
         :return: access_token 和 cookie 字符串
         """
+        cached = self._load_cache().get(str(mid))
+        if cached and cached['expires'] > time.time():
+            return cached['access_key'], cached['cookie']
+
         account_info = self.MONGO_CLIENT['bilibili']['accounts'].find_one({'mid': mid})
         access_key = account_info['token_info']['access_token']
         refresh_token = account_info['token_info']['refresh_token']
@@ -61,9 +114,34 @@ class BilibiliAuth:
         cookie_str = concat_cookies(cookie_info)
         last_update = account_info['last_update']
 
-        # 如果距离上次更新时间超过 30 天，则重新获取 access_token
-        if (datetime.now() - last_update).days > 14:
+        # 如果距离上次更新时间超过 14 天，则重新获取 access_token
+        if (datetime.now() - last_update).days > REFRESH_DAYS:
             access_key, cookie_str = self.refresh_access_token(access_key, refresh_token)
+            last_update = datetime.now()
+            expires_in = None
+        else:
+            expires_in = account_info['token_info'].get('expires_in')
+        expires = last_update.timestamp() + REFRESH_DAYS * 86400
+        if expires_in:
+            expires = min(expires, last_update.timestamp() + expires_in)
+        self._save_cache(mid, access_key, cookie_str, expires)
+        return access_key, cookie_str
+
+    def list_accounts(self) -> list:
+        """
+        :return: 数据库中全部账号的 mid 列表
+        """
+        return [account['mid'] for account in self.MONGO_CLIENT['bilibili']['accounts'].find({}, {'mid': 1})]
+
+    def refresh(self, mid):
+        """
+        立即刷新指定用户的 access_token（例如请求返回认证错误时），并更新本地缓存
+        :param mid: 用户的 mid
+        :return: 新的 access_token 和 cookie 字符串
+        """
+        token_info = self.MONGO_CLIENT['bilibili']['accounts'].find_one({'mid': mid})['token_info']
+        access_key, cookie_str = self.refresh_access_token(token_info['access_token'], token_info['refresh_token'])
+        self._save_cache(mid, access_key, cookie_str, time.time() + REFRESH_DAYS * 86400)
         return access_key, cookie_str
 
     def refresh_access_token(self, access_key, refresh_token):
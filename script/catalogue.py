@@ -0,0 +1,95 @@
+# -*- coding: UTF-8 -*-
+import argparse
+import gzip
+import hashlib
+import json
+import os
+
+from output import write_if_changed
+
+
+def load_packages(list_dir='list', ambiguous=None) -> list:
+    """
+    读取输出目录中的全部表情包
+    同一ID存在多个文件（改名遗留）时无法判断哪个是当前名称（git checkout 后修改时间不反映写入顺序），跳过该ID
+    :param list_dir: 表情包输出目录
+    :param ambiguous: 传入字典时将跳过的ID及其文件名列表记入其中，由调用方处理；否则打印警告
+    :return: 按ID排序的表情包字典列表
+    """
+    files = {}
+    for filename in os.listdir(list_dir):
+        id_, sep, _ = filename.partition('-')
+        if sep and id_.isdigit() and filename.endswith('.json'):
+            files.setdefault(int(id_), []).append(filename)
+
+    packages = []
+    for id_ in sorted(files):
+        if len(files[id_]) > 1:
+            if ambiguous is None:
+                print(f"[WARN] 表情包ID {id_} 存在多个文件 {sorted(files[id_])}，已跳过，"
+                      f"可运行 python script/main.py --reconcile 清理")
+            else:
+                ambiguous[id_] = sorted(files[id_])
+            continue
+        with open(os.path.join(list_dir, files[id_][0]), 'r', encoding='utf-8') as f:
+            packages.append(json.load(f))
+    return packages
+
+
+def build_emote_index(packages: list) -> dict:
+    """
+    构建 表情文本→图片地址 的索引，文本重复时保留ID最小的表情包中的表情
+    :param packages: 按ID排序的表情包字典列表
+    :return: 索引字典
+    """
+    index = {}
+    for package in packages:
+        for emote in package.get('emote', []):
+            index.setdefault(emote['text'], emote['url'])
+    return index
+
+
+def index_shard(text: str) -> str:
+    """
+    计算表情文本所在的索引分片，消费方查询时只需获取对应分片
+    :param text: 表情文本（不含方括号）
+    :return: 分片名（两位十六进制）
+    """
+    return hashlib.md5(text.encode('utf-8')).hexdigest()[:2]
+
+
+def build_catalogue(packages: list, out_dir='catalogue') -> dict:
+    """
+    生成合并的表情包目录：
+    - emoji.ndjson：每行一个压缩格式的表情包，按ID排序
+    - emoji.ndjson.gz：上述文件的 gzip 压缩版本
+    - emote_index/<分片>.json：表情文本→图片地址 的索引，按 index_shard 分为 256 个分片
+    内容未变化的文件不会重写
+    :param packages: 按ID排序的表情包字典列表
+    :param out_dir: 输出目录
+    :return: {文件名: 是否发生写入}
+    """
+    os.makedirs(os.path.join(out_dir, 'emote_index'), exist_ok=True)
+    ndjson = ''.join(
+        json.dumps(package, ensure_ascii=False, separators=(',', ':')) + '\n' for package in packages
+    ).encode('utf-8')
+    files = {
+        'emoji.ndjson': ndjson,
+        'emoji.ndjson.gz': gzip.compress(ndjson, compresslevel=9, mtime=0),  # 固定 mtime，保证内容不变时输出不变
+    }
+    shards = {}
+    for text, url in build_emote_index(packages).items():
+        shards.setdefault(index_shard(text), {})[text] = url
+    for shard, index in shards.items():
+        files[f'emote_index/{shard}.json'] = json.dumps(index, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return {name: write_if_changed(os.path.join(out_dir, name), data) for name, data in files.items()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='由 list/ 生成合并的表情包目录')
+    parser.add_argument('--list-dir', default='list', help='表情包输出目录')
+    parser.add_argument('--out-dir', default='catalogue', help='目录文件输出目录')
+    args = parser.parse_args()
+
+    result = build_catalogue(load_packages(args.list_dir), args.out_dir)
+    print(f"[INFO] 目录生成完成: 更新 {sum(result.values())} 个文件，未变化 {len(result) - sum(result.values())} 个文件")
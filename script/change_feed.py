@@ -0,0 +1,130 @@
+# -*- coding: UTF-8 -*-
+import json
+import os
+import threading
+import time
+
+from output import atomic_write
+
+EMOTE_URL_FIELDS = ('url', 'gif_url', 'webp_url')
+PACKAGE_FIELDS = ('icon', 'resource_type')
+
+
+def _keyed_emotes(package: dict) -> dict:
+    """
+    :return: (表情文本, 同名序号) → 表情 的字典；同一表情包中重名的表情按出现顺序区分
+    """
+    seen = {}
+    emotes = {}
+    for emote in package.get('emote') or []:
+        n = seen[emote['text']] = seen.get(emote['text'], -1) + 1
+        emotes[(emote['text'], n)] = emote
+    return emotes
+
+
+def diff_package(previous, current: dict) -> list:
+    """
+    比较表情包的新旧内容
+    :param previous: 原有的表情包字典，新增时为 None
+    :param current: 解析后的表情包字典
+    :return: 变更事件列表，每个事件包含 type 与对应字段
+    """
+    if previous is None:
+        return [{'type': 'package_added', 'emotes': len(current.get('emote') or [])}]
+    events = []
+    if previous['text'] != current['text']:
+        events.append({'type': 'package_renamed', 'from': previous['text']})
+    fields = {field: [previous.get(field), current.get(field)]
+              for field in PACKAGE_FIELDS if previous.get(field) != current.get(field)}
+    if fields:
+        events.append({'type': 'package_updated', 'fields': fields})
+
+    old, new = _keyed_emotes(previous), _keyed_emotes(current)
+    for key, emote in new.items():
+        if key not in old:
+            events.append({'type': 'emote_added', 'emote': key[0], 'url': emote['url']})
+            continue
+        for field in EMOTE_URL_FIELDS:
+            if old[key].get(field) != emote.get(field):
+                events.append({'type': 'emote_repointed', 'emote': key[0], 'field': field,
+                               'from': old[key].get(field), 'to': emote.get(field)})
+    for key, emote in old.items():
+        if key not in new:
+            events.append({'type': 'emote_removed', 'emote': key[0], 'url': emote['url']})
+    return events
+
+
+class ChangeFeed:
+    """
+    扫描期间生成的结构化变更记录，作为 EmojiWriter 的 listener 使用：
+    - feed.ndjson：追加写入，每行一个事件 {"time", "id", "package", "type", ...}，消费方按行偏移或 time 增量读取
+    - summary.json：本次运行的统计、变更的表情包ID与可直接用作提交信息的 message，有变更的运行才会覆盖，
+      避免没有变更时产生需要提交的文件
+    多线程调用 record 是安全的
+    """
+
+    def __init__(self, out_dir='changes'):
+        """
+        :param out_dir: 输出目录
+        """
+        self.out_dir = out_dir
+        self.lock = threading.Lock()
+        self.events = []
+
+    def record(self, emoji_info: dict, status: str, previous, removed=()):
+        """
+        EmojiWriter 的 listener：记录一个新增或更新的表情包的变更
+        删除的旧文件各记录一个 stale_file_removed 事件，当前名称的文件已存在、内容也未变化时同样记录
+        :param emoji_info: 解析后的表情包字典
+        :param status: 'added' 或 'changed'
+        :param previous: 原有的表情包字典，新增时为 None
+        :param removed: 删除的同一ID的旧文件名列表
+        """
+        events = diff_package(previous, emoji_info) + [{'type': 'stale_file_removed', 'file': name} for name in removed]
+        events = [dict({'id': emoji_info['id'], 'package': emoji_info['text']}, **event) for event in events]
+        with self.lock:
+            self.events.extend(events)
+
+    def summary(self, now: int) -> dict:
+        """
+        :param now: 本次运行的时间戳
+        :return: 本次运行的变更统计
+        """
+        counts = {}
+        for event in self.events:
+            counts[event['type']] = counts.get(event['type'], 0) + 1
+        parts = [
+            (counts.get('package_added', 0), 'new packages'),
+            (counts.get('package_renamed', 0), 'renamed'),
+            (counts.get('package_updated', 0), 'updated'),
+            (counts.get('emote_added', 0), 'emotes added'),
+            (counts.get('emote_removed', 0), 'removed'),
+            (counts.get('emote_repointed', 0), 're-pointed'),
+            (counts.get('stale_file_removed', 0), 'stale files removed'),
+        ]
+        return {
+            'time': now,
+            'counts': counts,
+            'packages': sorted({event['id'] for event in self.events}),
+            'message': ', '.join(f'{n} {label}' for n, label in parts if n) or 'no content changes',
+        }
+
+    def flush(self) -> dict:
+        """
+        按表情包ID排序后追加写入本次运行的事件，并覆盖写入本次运行的统计；没有变更时不写入任何文件
+        :return: 本次运行的变更统计
+        """
+        now = int(time.time())
+        with self.lock:
+            events = sorted(self.events, key=lambda event: event['id'])  # 排序稳定，同一表情包的事件保持顺序
+            summary = self.summary(now)
+            self.events = []
+        if not events:
+            return summary
+        os.makedirs(self.out_dir, exist_ok=True)
+        with open(os.path.join(self.out_dir, 'feed.ndjson'), 'a', encoding='utf-8') as f:
+            f.writelines(json.dumps(dict({'time': now}, **event), ensure_ascii=False, separators=(',', ':')) + '\n'
+                         for event in events)
+        atomic_write(os.path.join(self.out_dir, 'summary.json'),
+                     json.dumps(summary, ensure_ascii=False, indent=2).encode('utf-8'))
+        return summary
@@ -0,0 +1,100 @@
+# -*- coding: UTF-8 -*-
+import atexit
+import json
+import os
+import threading
+import time
+
+
+class Checkpoint:
+    """
+    扫描断点：以追加方式记录已完成与失败的ID，中断后可通过 --resume 从断点继续
+
+    文件格式为每行一条记录：
+    d <id> [状态]  该ID已完成（已保存或确认不存在），设置了 state 时附带该ID在扫描状态中的记录（JSON）
+    f <id>         该ID重试后仍失败，续扫时优先处理
+    扫描状态只在扫描完整结束时保存，中断前已完成的ID的状态由断点中的记录恢复
+    """
+
+    def __init__(self, path='scan_checkpoint.log', flush_every=500, flush_interval=5.0, state=None):
+        """
+        :param path: 断点文件路径
+        :param flush_every: 缓冲的记录数达到该值时写入文件
+        :param flush_interval: 距离上次写入超过该秒数时写入文件
+        :param state: 扫描状态，标记完成时记录该ID的状态，load() 时恢复
+        """
+        self.path = path
+        self.state = state
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.flushed = time.monotonic()
+        self.lock = threading.Lock()
+        atexit.register(self.flush)  # 异常退出时尽量保存缓冲中的记录
+
+    def load(self) -> tuple:
+        """
+        读取断点，设置了 state 时同时将已完成ID的状态恢复到扫描状态中
+        :return: (已完成的ID集合, 失败且尚未完成的ID集合)
+        """
+        done, failed = set(), set()
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    kind, _, rest = line.strip().partition(' ')
+                    id_, _, snapshot = rest.partition(' ')
+                    if not id_.isdigit():
+                        continue
+                    if kind == 'd' and snapshot and self.state:
+                        try:
+                            self.state.restore(int(id_), json.loads(snapshot))
+                        except ValueError:  # 中断时可能写了半行
+                            continue
+                    (done if kind == 'd' else failed).add(int(id_))
+        return done, failed - done
+
+    def reset(self):
+        """
+        开始新的扫描，清空断点
+        """
+        with self.lock:
+            self.buffer = []
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def _append(self, kind: str, id_, snapshot=None):
+        line = f'{kind} {id_} {json.dumps(snapshot, separators=(",", ":"))}\n' if snapshot else f'{kind} {id_}\n'
+        with self.lock:
+            self.buffer.append(line)
+            due = len(self.buffer) >= self.flush_every or time.monotonic() - self.flushed >= self.flush_interval
+        if due:
+            self.flush()
+
+    def mark_done(self, id_):
+        """
+        记录已完成的ID，该ID的扫描状态应已记录
+        """
+        self._append('d', id_, self.state.snapshot(id_) if self.state else None)
+
+    def mark_failed(self, id_):
+        """
+        记录失败的ID
+        """
+        self._append('f', id_)
+
+    def flush(self):
+        """
+        将缓冲的记录追加写入文件
+        """
+        with self.lock:
+            if self.buffer:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(''.join(self.buffer))
+                self.buffer = []
+            self.flushed = time.monotonic()
+
+    def clear(self):
+        """
+        扫描完整结束后删除断点
+        """
+        self.reset()
@@ -0,0 +1,50 @@
+# -*- coding: UTF-8 -*-
+
+
+def discover_latest_id(probe, seed: int, window=40, max_probes=64) -> int:
+    """
+    从已知ID出发，倍增 + 二分查找当前存在的最大表情包ID
+    每次探测一个长度为 window 的ID窗口，因此允许ID之间存在短于 window 的空洞
+    :param probe: 探测函数，传入ID列表，返回其中存在表情包的ID列表
+    :param seed: 起点，通常为已知存在的最大ID
+    :param window: 单次探测的窗口大小（不超过批量接口上限）
+    :param max_probes: 最多探测次数，超过后返回当前结果
+    :return: 找到的最大表情包ID，不小于 seed
+    """
+    probes = 0
+
+    def probe_window(start):
+        nonlocal probes
+        probes += 1
+        found = probe(list(range(start, start + window)))
+        return max(found) if found else None
+
+    lo = seed
+    try:
+        while probes < max_probes:
+            found = probe_window(lo + 1)  # 紧邻窗口为空，说明已到达末尾
+            if found is None:
+                break
+            lo = found
+
+            # 倍增：步长翻倍直到遇到空窗口
+            step = window * 2
+            while probes < max_probes:
+                found = probe_window(lo + step)
+                if found is None:
+                    break
+                lo = found
+                step *= 2
+            hi = lo + step
+
+            # 二分：在 (lo, hi) 之间缩小范围
+            while hi - lo > window and probes < max_probes:
+                mid = (lo + hi) // 2
+                found = probe_window(mid)
+                if found is None:
+                    hi = mid
+                else:
+                    lo = found
+    except Exception as e:
+        print(f"[WARN] 探测最新表情包ID失败，使用当前结果 {lo}，错误: {e}")
+    return lo
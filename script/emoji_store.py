@@ -0,0 +1,121 @@
+# -*- coding: UTF-8 -*-
+import argparse
+import os
+import sqlite3
+import threading
+
+from asset_mirror import asset_key
+from catalogue import load_packages
+from output import EmojiWriter
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS packages ('
+    'id INTEGER PRIMARY KEY, text TEXT NOT NULL, icon TEXT NOT NULL, resource_type INTEGER, has_emote INTEGER NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS emotes ('
+    'package_id INTEGER NOT NULL, position INTEGER NOT NULL, text TEXT NOT NULL, url TEXT NOT NULL, '
+    'url_hash TEXT NOT NULL, gif_url TEXT, webp_url TEXT, PRIMARY KEY (package_id, position)) WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS packages_resource_type ON packages (resource_type)',
+    'CREATE INDEX IF NOT EXISTS emotes_text ON emotes (text)',
+    'CREATE INDEX IF NOT EXISTS emotes_url_hash ON emotes (url_hash)',
+)
+
+
+class EmojiStore:
+    """
+    表情包 SQLite 存储，作为 list/ 之外的输出后端：
+    - packages：每个表情包一行，主键为表情包ID
+    - emotes：每个表情一行，主键为 (表情包ID, 序号)，按表情文本与图片哈希（asset_key）建立索引
+    resource_type、gif_url、webp_url 为 NULL 表示原数据中没有该字段，导出时可还原与 list/ 完全一致的文件
+    多线程调用是安全的
+    """
+
+    def __init__(self, path='emoji.sqlite'):
+        """
+        打开数据库，不存在时创建
+        :param path: 数据库路径
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        for statement in SCHEMA:
+            self.db.execute(statement)
+
+    def upsert(self, packages: list):
+        """
+        在一个事务中写入一批表情包，已存在的表情包整体替换
+        :param packages: 解析后的表情包字典列表
+        """
+        package_rows = []
+        emote_rows = []
+        for package in packages:
+            package_rows.append((package['id'], package['text'], package['icon'], package.get('resource_type'),
+                                 'emote' in package))
+            for position, emote in enumerate(package.get('emote', [])):
+                emote_rows.append((package['id'], position, emote['text'], emote['url'], asset_key(emote['url']),
+                                   emote.get('gif_url'), emote.get('webp_url')))
+        with self.lock, self.db:
+            self.db.executemany('INSERT OR REPLACE INTO packages VALUES (?, ?, ?, ?, ?)', package_rows)
+            self.db.executemany('DELETE FROM emotes WHERE package_id = ?', [(row[0],) for row in package_rows])
+            self.db.executemany('INSERT INTO emotes VALUES (?, ?, ?, ?, ?, ?, ?)', emote_rows)
+
+    def packages(self):
+        """
+        按ID顺序读取全部表情包，字段与顺序与 _parse_package 的结果一致
+        :return: 表情包字典的生成器
+        """
+        with self.lock:
+            package_rows = self.db.execute('SELECT * FROM packages ORDER BY id').fetchall()
+            emote_rows = self.db.execute(
+                'SELECT package_id, text, url, gif_url, webp_url FROM emotes ORDER BY package_id, position').fetchall()
+        emotes = {}
+        for package_id, text, url, gif_url, webp_url in emote_rows:
+            emote = {'text': text, 'url': url}
+            if gif_url is not None:
+                emote['gif_url'] = gif_url
+            if webp_url is not None:
+                emote['webp_url'] = webp_url
+            emotes.setdefault(package_id, []).append(emote)
+        for id_, text, icon, resource_type, has_emote in package_rows:
+            package = {'id': id_, 'text': text, 'icon': icon}
+            if resource_type is not None:
+                package['resource_type'] = resource_type
+            if has_emote:
+                package['emote'] = emotes.get(id_, [])
+            yield package
+
+    def export(self, out_dir='list') -> EmojiWriter:
+        """
+        由数据库重新生成 list/ 中的表情包文件，内容未变化的文件不会重写
+        数据库之外的文件（包括同一ID的其他名称）不会删除，导出后仍有多个文件的ID会打印警告
+        :param out_dir: 输出目录
+        :return: 输出层，可通过 summary() 获取写入统计
+        """
+        writer = EmojiWriter(out_dir, remove_stale=False)
+        for package in self.packages():
+            writer.save(package)
+        for id_ in writer.duplicates():
+            print(f"[WARN] 表情包ID {id_} 在 {out_dir} 中存在多个文件 {sorted(writer.index[id_])}，未删除")
+        return writer
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='表情包 SQLite 存储的导入与导出')
+    parser.add_argument('command', choices=['import', 'export'], help='import: 由 list/ 导入数据库；export: 由数据库重新生成 list/')
+    parser.add_argument('--db', default=os.getenv('EMOJI_DB', 'emoji.sqlite'), help='数据库路径')
+    parser.add_argument('--list-dir', default='list', help='表情包输出目录')
+    args = parser.parse_args()
+
+    store = EmojiStore(args.db)
+    if args.command == 'import':
+        packages = load_packages(args.list_dir)
+        store.upsert(packages)
+        print(f"[INFO] 导入完成: {len(packages)} 个表情包")
+    else:
+        print(f"[INFO] 导出完成: {store.export(args.list_dir).summary()}")
+    store.close()
@@ -0,0 +1,208 @@
+# -*- coding: UTF-8 -*-
+import argparse
+import gc
+import json
+import os
+import pickle
+import threading
+
+from catalogue import load_packages
+from output import atomic_write
+
+INDEX_VERSION = 1
+MAX_EMOTES = 10000  # 单个表情包的表情数上限，用于把 (表情包ID, 序号) 编码为一个整数
+
+
+def _bigrams(text: str) -> set:
+    text = text.lower()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def _strip(text: str) -> str:
+    return text.strip().replace('[', '').replace(']', '')
+
+
+class EmoteSearchIndex:
+    """
+    表情文本检索索引，支持：
+    - 精确匹配：doge_金箍 或 [doge_金箍]
+    - 带表情包名前缀的匹配：小黄脸_笑哭（表情本身的文本为 笑哭）
+    - 子串匹配：基于二元组倒排索引
+    索引以 pickle 持久化，可按表情包增量更新；多线程调用 update_package 是安全的
+    """
+
+    def __init__(self):
+        self.packages = {}  # 表情包ID -> (表情包名, [(表情文本, 图片地址), ...])
+        self.exact = {}  # 表情文本 -> [引用]
+        self.prefixed = {}  # 表情包名_表情文本 -> [引用]
+        self.grams = {}  # 二元组 -> {引用}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def build(cls, list_dir='list'):
+        """
+        由输出目录构建索引
+        :param list_dir: 表情包输出目录
+        :return: EmoteSearchIndex 实例
+        """
+        index = cls()
+        for package in load_packages(list_dir):
+            index.update_package(package)
+        return index
+
+    @classmethod
+    def load(cls, path):
+        """
+        加载持久化的索引
+        :param path: 索引文件路径
+        :return: EmoteSearchIndex 实例；文件不存在或版本不匹配时返回 None
+        """
+        if not os.path.exists(path):
+            return None
+        gc.disable()  # 反序列化大量小对象时暂停垃圾回收，加载耗时约减半
+        try:
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+        finally:
+            gc.enable()
+        if data.get('version') != INDEX_VERSION:
+            return None
+        index = cls()
+        index.packages, index.exact, index.prefixed, index.grams = (
+            data['packages'], data['exact'], data['prefixed'], data['grams'])
+        return index
+
+    @classmethod
+    def load_or_build(cls, path, list_dir='list'):
+        """
+        加载索引，不存在时由输出目录构建
+        """
+        return cls.load(path) or cls.build(list_dir)
+
+    def save(self, path):
+        """
+        持久化索引
+        :param path: 索引文件路径
+        """
+        with self.lock:
+            data = pickle.dumps({
+                'version': INDEX_VERSION,
+                'packages': self.packages,
+                'exact': self.exact,
+                'prefixed': self.prefixed,
+                'grams': self.grams,
+            }, protocol=pickle.HIGHEST_PROTOCOL)
+        atomic_write(path, data)
+
+    def _keys(self, package_id):
+        """
+        遍历表情包中每个表情的 (引用, 表情文本, 带前缀文本)
+        """
+        package_text, emotes = self.packages[package_id]
+        for i, (text, _) in enumerate(emotes):
+            prefixed = text if text.startswith(f'{package_text}_') else f'{package_text}_{text}'
+            yield package_id * MAX_EMOTES + i, text, prefixed
+
+    def _remove(self, package_id):
+        if package_id not in self.packages:
+            return
+        for ref, text, prefixed in self._keys(package_id):
+            for table, key in ((self.exact, text), (self.prefixed, prefixed)):
+                refs = table.get(key)
+                if refs is not None:
+                    refs.remove(ref)
+                    if not refs:
+                        del table[key]
+            for gram in _bigrams(text):
+                postings = self.grams.get(gram)
+                if postings is not None:
+                    postings.discard(ref)
+                    if not postings:
+                        del self.grams[gram]
+        del self.packages[package_id]
+
+    def update_package(self, emoji_info: dict):
+        """
+        新增或更新一个表情包的索引
+        :param emoji_info: 解析后的表情包字典
+        """
+        package_id = emoji_info['id']
+        emotes = [(emote['text'], emote['url']) for emote in emoji_info.get('emote', [])][:MAX_EMOTES]
+        with self.lock:
+            self._remove(package_id)
+            self.packages[package_id] = (emoji_info['text'], emotes)
+            for ref, text, prefixed in self._keys(package_id):
+                self.exact.setdefault(text, []).append(ref)
+                self.prefixed.setdefault(prefixed, []).append(ref)
+                for gram in _bigrams(text):
+                    self.grams.setdefault(gram, set()).add(ref)
+
+    def remove_package(self, package_id: int):
+        """
+        删除一个表情包的索引
+        :param package_id: 表情包ID
+        """
+        with self.lock:
+            self._remove(package_id)
+
+    def _result(self, ref) -> dict:
+        package_id, i = divmod(ref, MAX_EMOTES)
+        package_text, emotes = self.packages[package_id]
+        text, url = emotes[i]
+        return {'package_id': package_id, 'package': package_text, 'text': text, 'url': url}
+
+    def lookup(self, text: str) -> list:
+        """
+        精确查找表情，先匹配表情文本，再匹配 表情包名_表情文本
+        :param text: 表情文本，可以带方括号
+        :return: 匹配结果列表，按表情包ID排序
+        """
+        text = _strip(text)
+        with self.lock:
+            refs = self.exact.get(text) or self.prefixed.get(text) or []
+            return [self._result(ref) for ref in sorted(refs)]
+
+    def search(self, query: str, limit=20) -> list:
+        """
+        子串查找表情
+        :param query: 查询文本，可以带方括号
+        :param limit: 最多返回的结果数
+        :return: 匹配结果列表，按表情包ID排序
+        """
+        query = _strip(query).lower()
+        if not query:
+            return []
+        with self.lock:
+            grams = _bigrams(query)
+            if grams:
+                postings = sorted((self.grams.get(gram, set()) for gram in grams), key=len)
+                candidates = set.intersection(*postings) if postings[0] else set()
+            else:  # 单字查询，无法使用二元组索引
+                candidates = {ref for package_id in self.packages for ref, _, _ in self._keys(package_id)}
+            results = []
+            for ref in sorted(candidates):
+                result = self._result(ref)
+                if query in result['text'].lower():
+                    results.append(result)
+                    if len(results) >= limit:
+                        break
+            return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='查询表情文本对应的图片地址')
+    parser.add_argument('query', nargs='*', help='表情文本，例如 doge_金箍 或 [doge_金箍]')
+    parser.add_argument('--substring', action='store_true', help='子串匹配')
+    parser.add_argument('--limit', type=int, default=20, help='子串匹配最多返回的结果数')
+    parser.add_argument('--rebuild', action='store_true', help='由 list/ 重新构建索引')
+    parser.add_argument('--index', default=os.getenv('SEARCH_INDEX', 'emote_search.pickle'), help='索引文件路径')
+    parser.add_argument('--list-dir', default='list', help='表情包输出目录')
+    args = parser.parse_args()
+
+    index = None if args.rebuild else EmoteSearchIndex.load(args.index)
+    if index is None:
+        index = EmoteSearchIndex.build(args.list_dir)
+        index.save(args.index)
+    for q in args.query:
+        matches = index.search(q, args.limit) if args.substring else index.lookup(q)
+        print(json.dumps({'query': q, 'results': matches}, ensure_ascii=False))
@@ -0,0 +1,216 @@
+# -*- coding: UTF-8 -*-
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import urllib.parse
+import zlib
+from collections import namedtuple
+
+from metrics import METRICS, timed_get
+
+VOLATILE_PARAMS = {'ts', 'sts', 'sign', 'access_key', 'appkey'}  # 每次请求都会变化或与账号相关的参数
+
+CacheEntry = namedtuple('CacheEntry', 'body etag last_modified digest fetched')
+
+
+def cache_key(endpoint: str, params: dict) -> str:
+    """
+    :param endpoint: 接口名
+    :param params: 请求参数
+    :return: 去掉时间戳、签名与账号参数后的缓存键
+    """
+    items = sorted((k, str(v)) for k, v in params.items() if k not in VOLATILE_PARAMS)
+    return f'{endpoint}?{urllib.parse.urlencode(items)}'
+
+
+class CachedResponse:
+    """
+    由缓存返回时代替 requests.Response
+    """
+
+    def __init__(self, content: bytes):
+        self.status_code = 200
+        self.headers = {}
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class ResponseCache:
+    """
+    持久化的 HTTP 响应缓存（SQLite），响应体压缩存储，并记录 ETag/Last-Modified 与内容摘要
+    未超过 max_age 的响应直接使用缓存；超过后带上验证头重新请求，304 时继续使用缓存
+    总大小超过 max_bytes 时按最近访问时间淘汰
+    """
+
+    def __init__(self, path='http_cache.sqlite', max_age=3600, max_bytes=256 * 1024 * 1024):
+        """
+        :param path: 缓存数据库路径
+        :param max_age: 缓存直接可用的秒数，0 表示每次都重新验证
+        :param max_bytes: 压缩后响应体的总大小上限
+        """
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, body BLOB, etag TEXT, last_modified TEXT, digest TEXT, '
+            'size INTEGER, fetched REAL, accessed REAL)'
+        )
+        self.db.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+        self.size = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def get(self, key: str):
+        """
+        :param key: 缓存键
+        :return: CacheEntry；不存在时返回 None
+        """
+        with self.lock:
+            row = self.db.execute(
+                'SELECT body, etag, last_modified, digest, fetched FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            self.db.execute('UPDATE responses SET accessed = ? WHERE key = ?', (time.time(), key))
+        return CacheEntry(zlib.decompress(row[0]), *row[1:])
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        """
+        :return: 缓存是否可以不经验证直接使用
+        """
+        return time.time() - entry.fetched < self.max_age
+
+    @staticmethod
+    def conditional_headers(entry: CacheEntry) -> dict:
+        """
+        :return: 重新验证缓存时附加的请求头
+        """
+        headers = {}
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def put(self, key: str, body: bytes, headers) -> bool:
+        """
+        保存响应
+        :param key: 缓存键
+        :param body: 响应体
+        :param headers: 响应头
+        :return: 内容是否与缓存中的不同
+        """
+        digest = hashlib.sha1(body).hexdigest()
+        data = zlib.compress(body)
+        now = time.time()
+        with self.lock:
+            row = self.db.execute('SELECT digest, size FROM responses WHERE key = ?', (key,)).fetchone()
+            self.db.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, data, headers.get('ETag'), headers.get('Last-Modified'), digest, len(data), now, now)
+            )
+            self.size += len(data) - (row[1] if row else 0)
+            if self.size > self.max_bytes:
+                self._evict()
+            self.db.commit()
+        return row is None or row[0] != digest
+
+    def refresh(self, key: str):
+        """
+        服务端确认缓存仍有效（304）时更新获取时间
+        """
+        with self.lock:
+            self.db.execute('UPDATE responses SET fetched = ? WHERE key = ?', (time.time(), key))
+            self.db.commit()
+
+    def _evict(self):
+        """
+        淘汰最久未访问的响应，直到总大小降到上限的 90% 以下
+        """
+        target = self.max_bytes * 0.9
+        rows = self.db.execute('SELECT key, size FROM responses ORDER BY accessed').fetchall()
+        evicted = []
+        for key, size in rows:
+            if self.size <= target:
+                break
+            evicted.append((key,))
+            self.size -= size
+        self.db.executemany('DELETE FROM responses WHERE key = ?', evicted)
+        METRICS.inc('http_cache_evictions', len(evicted))
+
+    def close(self):
+        with self.lock:
+            self.db.commit()
+            self.db.close()
+
+
+def cached_get(cache, get, endpoint: str, url: str, params: dict, headers=None, **kwargs) -> tuple:
+    """
+    带缓存的 timed_get：新鲜的缓存直接返回，否则带验证头请求，304 时返回缓存，成功（code 为 0）时更新缓存
+    :param cache: ResponseCache，None 表示不使用缓存
+    :param get: requests.get 或 Session.get
+    :param endpoint: 接口名
+    :param url: 请求地址
+    :param params: 请求参数
+    :param headers: 请求头
+    :param kwargs: 传给 get 的其他参数
+    :return: (响应或 CachedResponse, 解析后的 JSON；响应不是 JSON 时为 None)
+    """
+    if cache is None:
+        return timed_get(get, endpoint, url, params=params, headers=headers, **kwargs)
+    key = cache_key(endpoint, params)
+    entry = cache.get(key)
+    if entry and cache.is_fresh(entry):
+        METRICS.inc('http_cache', endpoint=endpoint, result='hit')
+        response = CachedResponse(entry.body)
+        return response, response.json()
+    if entry:
+        headers = dict(headers or {}, **cache.conditional_headers(entry))
+
+    response, res = timed_get(get, endpoint, url, params=params, headers=headers, **kwargs)
+    if entry and response.status_code == 304:
+        cache.refresh(key)
+        METRICS.inc('http_cache', endpoint=endpoint, result='revalidated')
+        response = CachedResponse(entry.body)
+        return response, response.json()
+    if response.status_code == 200 and isinstance(res, dict) and res.get('code') == 0:
+        changed = cache.put(key, response.content, response.headers)
+        result = 'miss' if entry is None else ('changed' if changed else 'unchanged')
+        METRICS.inc('http_cache', endpoint=endpoint, result=result)
+    return response, res
+
+
+def cached_items(cache, endpoint: str, ids: list, fetch) -> dict:
+    """
+    按单个ID缓存的批量请求：缓存中新鲜的ID直接返回，其余ID合并为一次请求，结果按ID分别写入缓存
+    批量接口的 ids 参数随批量大小与起点变化，整批作为缓存键几乎不会重复，因此以 (接口名, ID) 为键
+    接口未返回的ID记为 None，同样缓存；批量响应没有单个ID的验证头，过期的ID直接重新请求
+    :param cache: ResponseCache
+    :param endpoint: 接口名
+    :param ids: ID列表
+    :param fetch: 请求函数，参数为需要请求的ID列表，返回 {ID: 数据}；失败时抛出异常，不写入缓存
+    :return: {ID: 数据，不存在时为 None}
+    """
+    found, missing, entries = {}, [], {}
+    for id_ in ids:
+        entry = cache.get(cache_key(endpoint, {'id': id_}))
+        if entry and cache.is_fresh(entry):
+            METRICS.inc('http_cache', endpoint=endpoint, result='hit')
+            found[id_] = json.loads(entry.body)
+        else:
+            missing.append(id_)
+            entries[id_] = entry
+    if missing:
+        fetched = fetch(missing)
+        for id_ in missing:
+            found[id_] = fetched.get(id_)
+            body = json.dumps(found[id_], ensure_ascii=False, sort_keys=True).encode('utf-8')
+            changed = cache.put(cache_key(endpoint, {'id': id_}), body, {})
+            result = 'miss' if entries[id_] is None else ('changed' if changed else 'unchanged')
+            METRICS.inc('http_cache', endpoint=endpoint, result=result)
+    return found
@@ -0,0 +1,146 @@
+# -*- coding: UTF-8 -*-
+import bisect
+import time
+
+
+class IntervalSet:
+    """
+    有序且互不相交的闭区间集合，用于快速判断ID是否落在某些区间内
+    """
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+
+    @classmethod
+    def from_ids(cls, ids):
+        """
+        由ID集合构建区间集合，连续的ID合并为一个区间
+        :param ids: 整数ID的可迭代对象
+        :return: IntervalSet 实例
+        """
+        interval_set = cls()
+        for id_ in sorted(set(ids)):
+            if interval_set.ends and interval_set.ends[-1] + 1 == id_:
+                interval_set.ends[-1] = id_
+            else:
+                interval_set.starts.append(id_)
+                interval_set.ends.append(id_)
+        return interval_set
+
+    @classmethod
+    def from_config(cls, entries):
+        """
+        由配置构建区间集合，每项可以是单个ID、[起始, 结束] 或 "起始-结束"（均为闭区间）
+        :param entries: 配置列表
+        :return: IntervalSet 实例
+        """
+        interval_set = cls()
+        for entry in entries:
+            if isinstance(entry, str):
+                lo, _, hi = entry.partition('-')
+                interval_set.add(int(lo), int(hi or lo))
+            elif isinstance(entry, (list, tuple)):
+                interval_set.add(int(entry[0]), int(entry[1]))
+            else:
+                interval_set.add(int(entry), int(entry))
+        return interval_set
+
+    def add(self, lo: int, hi: int):
+        """
+        加入区间 [lo, hi]，与相邻或重叠的区间合并
+        """
+        i = bisect.bisect_left(self.ends, lo - 1)
+        j = bisect.bisect_right(self.starts, hi + 1)
+        if i < j:
+            lo = min(lo, self.starts[i])
+            hi = max(hi, self.ends[j - 1])
+        self.starts[i:j] = [lo]
+        self.ends[i:j] = [hi]
+
+    def __contains__(self, id_) -> bool:
+        i = bisect.bisect_right(self.starts, id_) - 1
+        return i >= 0 and id_ <= self.ends[i]
+
+    def __len__(self) -> int:
+        return sum(hi - lo + 1 for lo, hi in zip(self.starts, self.ends))
+
+    def gaps(self, start: int, stop: int):
+        """
+        遍历 [start, stop) 中不在集合内的ID，跳过整个区间而不是逐个判断
+        :param start: 起始ID
+        :param stop: 结束ID（不包含）
+        """
+        current = start
+        i = bisect.bisect_right(self.ends, start - 1)
+        while current < stop:
+            if i < len(self.starts) and self.starts[i] < stop:
+                yield from range(current, self.starts[i])
+                current = max(current, self.ends[i] + 1)
+                i += 1
+            else:
+                yield from range(current, stop)
+                break
+
+
+class IdPlanner:
+    """
+    扫描ID规划器：跳过忽略的ID与确认无表情包的区间，优先扫描新区间与密集区间
+    确认无表情包的ID按指数退避重新探测：已持续为空的时间越长，重新探测的间隔越长
+    """
+
+    def __init__(self, ignore, state=None, min_interval=86400, max_interval=16 * 86400, block=100):
+        """
+        初始化规划器
+        :param ignore: 需要忽略的ID配置，见 IntervalSet.from_config
+        :param state: ScanState 实例，为空时不做退避与排序
+        :param min_interval: 空ID重新探测的最短间隔（秒）
+        :param max_interval: 空ID重新探测的最长间隔（秒）
+        :param block: 计算密度时的分块大小
+        """
+        self.ignore = IntervalSet.from_config(ignore)
+        self.state = state
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.block = block
+
+    def dead_ranges(self, now=None) -> IntervalSet:
+        """
+        :return: 本次无需探测的空ID区间（确认无表情包且未到重新探测时间）
+        """
+        now = now or int(time.time())
+        with self.state.lock:
+            entries = list(self.state.ids.items())
+        dead = []
+        for id_, (digest, fetched, changed) in entries:
+            if digest is None:
+                empty_for = fetched - (changed or fetched)  # 旧版本首次建立索引时记为 0，视为刚确认为空
+                interval = min(self.max_interval, max(self.min_interval, empty_for))
+                if now - fetched < interval:
+                    dead.append(id_)
+        return IntervalSet.from_ids(dead)
+
+    def plan(self, start: int, stop: int) -> list:
+        """
+        生成扫描ID列表
+        :param start: 起始ID
+        :param stop: 结束ID（不包含）
+        :return: 按优先级排序的ID列表：超过已知最大ID的新区间在前，其余按所在分块的密度从高到低
+        """
+        ids = list(self.ignore.gaps(start, stop))
+        if self.state is None:
+            return ids
+
+        max_id = self.state.max_package_id()
+        dead = self.dead_ranges()
+        density = {}
+        with self.state.lock:
+            entries = list(self.state.ids.items())
+        for id_, entry in entries:
+            if entry[0] is not None:
+                density[id_ // self.block] = density.get(id_ // self.block, 0) + 1
+
+        newest = [id_ for id_ in ids if id_ > max_id]
+        known = [id_ for id_ in ids if id_ <= max_id and id_ not in dead]
+        known.sort(key=lambda id_: -density.get(id_ // self.block, 0))  # 稳定排序，分块内保持ID顺序
+        return newest + known
@@ -0,0 +1,116 @@
+# -*- coding: UTF-8 -*-
+import concurrent.futures
+import time
+
+import requests
+from requests.exceptions import RequestException
+
+from account_pool import AUTH_CODES, AccountPool
+from bilibili_auth import appsign
+from http_cache import cached_get
+from metrics import METRICS
+from retry_policy import RetryPolicy, parse_retry_after
+
+HEADERS = {
+    'native_api_from': 'h5',
+    'accept': 'application/json, text/plain, */*',
+    'referer': 'https://www.bilibili.com/h5/mall/emoji-package/more?navhide=1&native.theme=0',
+    'content-type': 'application/json',
+    'user-agent': (
+        'Mozilla/5.0 (Linux; Android 13; Mi 10 Build/TKQ1.221114.001; wv) '
+        'AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/135.0.7049.111 '
+        'Mobile Safari/537.36 os/android model/Mi 10 build/8230800 osVer/13 sdkInt/33 '
+        'network/2 BiliApp/8230800 mobi_app/android_i channel/master innerVer/8230800 '
+        'c_locale/zh_CN s_locale/zh_CN disable_rcmd/0 themeId/0 sh/33 3.20.4'
+    ),
+    'bili-http-engine': 'cronet',
+    'accept-encoding': 'gzip, deflate, br'
+}
+
+
+class PackageListing:
+    """
+    AllPackages 列表接口，每页请求由账号池中的账号签名发送
+    """
+
+    def __init__(self, pool: AccountPool, api_base='https://api.bilibili.com', proxy=None, retry: RetryPolicy = None,
+                 page_size=100, cache=None):
+        """
+        :param pool: 账号池
+        :param api_base: 接口地址
+        :param proxy: requests 代理配置
+        :param retry: 重试策略
+        :param page_size: 每页表情包数
+        :param cache: 响应缓存 ResponseCache，None 表示不缓存
+        """
+        self.pool = pool
+        self.url = f'{api_base}/bapis/main.community.interface.emote.EmoteService/AllPackages'
+        self.proxy = proxy or {}
+        self.retry = retry or RetryPolicy()
+        self.page_size = page_size
+        self.cache = cache
+
+    def fetch_page(self, pn: int) -> dict:
+        """
+        获取一页列表；账号被限流或认证失败时换用其他账号，临时错误按重试策略退避重试
+        :param pn: 页码，从 1 开始
+        :return: 接口返回的 data，包含 total 与 packages
+        """
+        reason = None
+        for attempt in range(self.retry.attempts):
+            account = self.pool.acquire()
+            params = {
+                'access_key': account.access_key,
+                'build': 8230800,
+                'business': 'reply',
+                'channel': 'master',
+                'disable_rcmd': 0,
+                'mobi_app': 'android_i',
+                'platform': 'android',
+                'pn': pn,
+                'ps': self.page_size,
+                'search': '',
+                'statistics': '{"appId":14,"platform":3,"version":"3.20.4","abtest":""}',
+                'ts': int(time.time())
+            }
+            signed_params = appsign(params, 'bb3101000e232e27', '36efcfed79309338ced0380abd824ac1')
+            retry_after = None
+            try:
+                response, res = cached_get(self.cache, requests.get, 'AllPackages', self.url, signed_params,
+                                           dict(HEADERS, cookie=account.cookie), proxies=self.proxy, timeout=10)
+            except RequestException as e:
+                kind, reason = 'transient', e
+            else:
+                code = res.get('code') if isinstance(res, dict) else None
+                if code in AUTH_CODES:
+                    self.pool.report_auth_error(account)
+                    reason = f"code {code}"
+                    continue
+                kind = self.retry.classify(response.status_code, code)
+                reason = res.get('message') if isinstance(res, dict) else f"HTTP {response.status_code}"
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if kind == 'ok':
+                return res.get('data') or {}
+            if kind == 'permanent':
+                break
+            METRICS.inc('retries', endpoint='AllPackages')
+            if kind == 'throttle' and len(self.pool) > 1:  # 换用其他账号立即重试
+                self.pool.report_throttle(account)
+                continue
+            time.sleep(self.retry.backoff(attempt, retry_after))
+        raise Exception(f"AllPackages 第 {pn} 页获取失败: {reason}")
+
+    def fetch_all(self, concurrency=8) -> list:
+        """
+        并发获取全部页：先获取第一页得到总数，再并发获取其余页
+        :param concurrency: 同时请求的页数
+        :return: 按ID排序、去重后的列表中的全部表情包
+        """
+        first = self.fetch_page(1)
+        pages = -(-first.get('total', 0) // self.page_size)
+        packages = {package['id']: package for package in first.get('packages') or []}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for data in executor.map(self.fetch_page, range(2, pages + 1)):
+                for package in data.get('packages') or []:  # 翻页期间列表变化时同一表情包可能出现在两页
+                    packages[package['id']] = package
+        return [packages[id_] for id_ in sorted(packages)]
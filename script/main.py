@@ -1,182 +1,167 @@
 # -*- coding: UTF-8 -*-
-import requests
-import json
 import time
-import os
+import argparse
+import concurrent.futures
 
-from bilibili_auth import BilibiliAuth, appsign
+from adaptive_batch import AdaptiveBatchSizer
+from http_cache import cached_items
+from metrics import METRICS
+from retry_policy import ThrottledError, TransientError
+from scanner_base import BaseBiliEmoji
+from sharding import ShardSpec
 
 
-class BiliEmoji:
+class BiliEmoji(BaseBiliEmoji):
     """
-    用于获取B站表情包信息并保存的工具类
+    用于获取B站表情包信息并保存的工具类，通过批量接口 /x/emote/package 获取
     """
 
-    def __init__(self):
-        # 初始化配置和认证信息
-        self.PROXY = json.loads(os.getenv('PROXY', '{}'))  # 代理配置
-        self.SCAN_CONFIG = json.loads(
-            os.getenv('SCAN_CONFIG', '{"start": 1, "end": 10000, "step": 40, "ignore": [4, 250]}'))  # 扫描配置
-
-        self.ACCOUNT = int(os.getenv('ACCOUNT', 1))  # 账号ID
-        self.AUTH = BilibiliAuth(os.getenv('ACCOUNT_DB_URI', 'mongodb://localhost:27017/'))  # 认证模块
-        self.ACCESS_KEY, self.COOKIE = self.AUTH.get_access(self.ACCOUNT)  # 获取访问密钥和Cookie
-
     def get_emoji_info(self, ids: list) -> list:
         """
         根据表情包ID列表获取表情包信息
         :param ids: 表情包ID列表
         :return: 表情包信息列表
         """
-        params = {
-            'business': 'reply',
-            'ids': ','.join([str(i) for i in ids]),
-            'mobi_app': 'android_i'
-        }
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36 Edg/121.0.0.0',
-            'Referer': 'https://www.bilibili.com/',
-            'Origin': 'https://www.bilibili.com',
-            'Accept': '*/*',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Accept-Language': 'zh-CN,zh;q=0.9'
-        }
-        # 发送请求获取表情包信息
-        response = requests.get('https://api.bilibili.com/x/emote/package', params=params, proxies=self.PROXY,
-                                headers=headers)
-        response_json = response.json()
-        if response_json['code'] != 0:  # 检查返回结果是否正常
-            raise Exception(response_json['message'])
-
-        result = []
-        packages = response_json['data']['packages']
-        if packages:
-            for package in packages:
-                package_dict = self._parse_package(package)  # 解析表情包信息
-                result.append(package_dict)
-        return result
+        return [self._parse_package(package) for package in self._fetch_batch(ids)[0]]
 
-    @staticmethod
-    def _parse_package(package: dict) -> dict:
+    @METRICS.timed('get_emoji_info_seconds')
+    def _fetch_batch(self, ids: list) -> tuple:
         """
-        解析单个表情包信息
-        :param package: 表情包数据
-        :return: 解析后的表情包字典
+        获取一批表情包信息，启用响应缓存时按单个ID读取与写入缓存，只请求未命中的ID
+        :param ids: 表情包ID列表
+        :return: (接口返回的表情包列表, 响应体字节数)
         """
-        package_dict = {
-            'id': package['id'],
-            'text': package['text'],
-            'icon': package['url'].replace('http://', 'https://'),
-            'resource_type': package['resource_type'],
-        }
-        if 'emote' in package:
-            emote_list = []
-            for emote in package['emote']:
-                emote_data = {
-                    'text': emote['text'].replace('[', '').replace(']', ''),
-                    'url': emote['url'].replace('http://', 'https://'),
-                }
-                if 'gif_url' in emote:  # 动态表情
-                    emote_data['gif_url'] = emote['gif_url'].replace('http://', 'https://')
-                if 'webp_url' in emote:
-                    emote_data['webp_url'] = emote['webp_url'].replace('http://', 'https://')
-                emote_list.append(emote_data)
-            package_dict['emote'] = emote_list
-        return package_dict
+        if not self.HTTP_CACHE:
+            return self._request_batch(ids)
+        nbytes = 0
+
+        def fetch(missing):
+            nonlocal nbytes
+            packages, nbytes = self._request_batch(missing)
+            return {package['id']: package for package in packages}
 
-    @staticmethod
-    def save_emoji_info(emoji_info: dict):
+        found = cached_items(self.HTTP_CACHE, 'package', ids, fetch)
+        return [found[id_] for id_ in ids if found[id_]], nbytes
+
+    def reconcile(self):
         """
-        保存表情包信息到本地文件
-        :param emoji_info: 表情包信息字典
+        清理同一表情包ID对应的多个文件：重新获取这些ID并保存，保存时会删除过期的文件
         """
-        emoji_id = emoji_info['id']
-        emoji_text = emoji_info['text']
-        filename = f'{emoji_id}-{emoji_text}.json'
-        filepath = os.path.join('list', filename)
-        os.makedirs('list', exist_ok=True)  # 确保目录存在
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(json.dumps(emoji_info, ensure_ascii=False, indent=2))
-
-    def get_latest_emoji_id(self) -> int:
+        ids = self.WRITER.duplicates()
+        print(f"[INFO] 发现 {len(ids)} 个重复的表情包ID: {ids}")
+        found_ids = set()
+        for i in range(0, len(ids), self.SCAN_CONFIG['step']):
+            for emoji_info in self.get_emoji_info(ids[i:i + self.SCAN_CONFIG['step']]):
+                found_ids.add(emoji_info['id'])
+                self.save_emoji_info(emoji_info)
+        for id_ in ids:
+            if id_ not in found_ids:
+                print(f"[WARN] 表情包ID {id_} 已不存在，保留原有文件")
+
+    def _scan_batch(self, ids: list, sizer: AdaptiveBatchSizer):
         """
-        获取最新的表情包ID
-        :return: 最新表情包ID；失败时返回 SCAN_CONFIG['end']
+        获取一批表情包并提交到流水线
+        被限流时打开熔断器并按重试策略退避后重试同一批；网络错误与服务端临时错误同样退避后重试同一批，不打开熔断器；
+        批次本身的其他失败拆成两半分别重试
+        单个ID仍失败或多次被限流的批次进入 RETRY_QUEUE，在本次运行结束前统一重试
+        :param ids: 表情包ID列表
+        :param sizer: 批量大小调节器
         """
-        try:
-            base_url = 'https://api.bilibili.com/bapis/main.community.interface.emote.EmoteService/AllPackages'
-            ts = int(time.time())
-
-            params = {
-                'access_key': self.ACCESS_KEY,
-                'build': 8230800,
-                'business': 'reply',
-                'channel': 'master',
-                'disable_rcmd': 0,
-                'mobi_app': 'android_i',
-                'platform': 'android',
-                'pn': 1,
-                'ps': 100,
-                'search': '',
-                'statistics': '{"appId":14,"platform":3,"version":"3.20.4","abtest":""}',
-                'ts': ts
-            }
-
-            headers = {
-                'native_api_from': 'h5',
-                'cookie': self.COOKIE,
-                'accept': 'application/json, text/plain, */*',
-                'referer': 'https://www.bilibili.com/h5/mall/emoji-package/more?navhide=1&native.theme=0',
-                'content-type': 'application/json',
-                'user-agent': (
-                    'Mozilla/5.0 (Linux; Android 13; Mi 10 Build/TKQ1.221114.001; wv) '
-                    'AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/135.0.7049.111 '
-                    'Mobile Safari/537.36 os/android model/Mi 10 build/8230800 osVer/13 sdkInt/33 '
-                    'network/2 BiliApp/8230800 mobi_app/android_i channel/master innerVer/8230800 '
-                    'c_locale/zh_CN s_locale/zh_CN disable_rcmd/0 themeId/0 sh/33 3.20.4'
-                ),
-                'bili-http-engine': 'cronet',
-                'accept-encoding': 'gzip, deflate, br'
-            }
-
-            signed_params = appsign(params, 'bb3101000e232e27', '36efcfed79309338ced0380abd824ac1')
-            res1 = requests.get(base_url, params=signed_params, headers=headers, proxies=self.PROXY).json()
-
-            if res1.get('code') != 0:
-                print(f"[ERROR] 初次请求失败: {res1.get('message')}")
-                return self.SCAN_CONFIG['end']
-
-            total = res1.get('data', {}).get('total', 0)
-            params['pn'] = total // 100 + 1
-            params['ts'] = int(time.time())  # 更新时间戳
-            signed_params = appsign(params, 'bb3101000e232e27', '36efcfed79309338ced0380abd824ac1')
-            res = requests.get(base_url, params=signed_params, headers=headers, proxies=self.PROXY).json()
-
-            if res.get('code') == 0 and 'packages' in res['data']:
-                return max(*(pkg['id'] for pkg in res['data']['packages']), *(pkg['id'] for pkg in res1['data']['packages']))
-            else:
-                print(f"[ERROR] 获取最后一页失败: {res.get('message')}")
-                return self.SCAN_CONFIG['end']
-
-        except Exception as e:
-            print(f"[ERROR] 获取最新表情包ID异常: {e}")
-            return self.SCAN_CONFIG['end']
+        for attempt in range(self.RETRY.attempts):
+            self.BREAKER.wait()
+            start = time.monotonic()
+            try:
+                packages, nbytes = self._fetch_batch(ids)
+                break
+            except ThrottledError as e:
+                sizer.observe(len(ids), time.monotonic() - start, False)
+                self.BREAKER.record_throttle(e.retry_after)
+                print(f"[WARN] 批量获取 {ids[0]}-{ids[-1]} 被限流，重试 {attempt + 1}/{self.RETRY.attempts}，错误: {e}")
+                METRICS.inc('retries', endpoint='package')
+                time.sleep(self.RETRY.backoff(attempt, e.retry_after))
+            except TransientError as e:
+                sizer.observe(len(ids), time.monotonic() - start, False)
+                print(f"[WARN] 批量获取 {ids[0]}-{ids[-1]} 失败，重试 {attempt + 1}/{self.RETRY.attempts}，错误: {e}")
+                METRICS.inc('retries', endpoint='package')
+                time.sleep(self.RETRY.backoff(attempt, e.retry_after))
+            except Exception as e:
+                sizer.observe(len(ids), time.monotonic() - start, False)
+                if len(ids) == 1:
+                    print(f"[ERROR] 表情包ID {ids[0]} 获取失败: {e}")
+                    self.RETRY_QUEUE.add(ids[0])
+                    return
+                print(f"[WARN] 批量获取 {ids[0]}-{ids[-1]} 失败，拆分重试，错误: {e}")
+                METRICS.inc('retries', endpoint='package')
+                half = len(ids) // 2
+                self._scan_batch(ids[:half], sizer)
+                self._scan_batch(ids[half:], sizer)
+                return
+        else:
+            for id_ in ids:
+                self.RETRY_QUEUE.add(id_)
+            return
+        sizer.observe(len(ids), time.monotonic() - start, True, nbytes)
+
+        for package in packages:
+            self.PIPELINE.put(package['id'], package)  # 解析与保存交给流水线，写入跟不上时在此阻塞
+        found_ids = {package['id'] for package in packages}
+        for id_ in ids:
+            if id_ not in found_ids:  # 接口未返回的ID视为不存在
+                self.STATE.record_empty(id_)
+                self.CHECKPOINT.mark_done(id_)
 
     def main(self):
         """
-        主函数，获取表情包信息并保存
+        主函数，并发分批获取表情包信息，经流水线解析并保存，批量大小根据响应情况自动调整
+        """
+        sizer = AdaptiveBatchSizer(
+            initial=self.SCAN_CONFIG['step'],
+            minimum=self.SCAN_CONFIG.get('min_step', 5),
+            maximum=self.SCAN_CONFIG.get('max_step', 40)
+        )
+        self._scan(lambda ids: self._run_batches(ids, sizer))
+
+    def _run_batches(self, ids: list, sizer: AdaptiveBatchSizer):
+        """
+        并发分批获取给定的表情包ID
+        :param ids: 表情包ID列表
+        :param sizer: 批量大小调节器
         """
-        end_id = self.get_latest_emoji_id()
-        ids = list(range(self.SCAN_CONFIG['start'], end_id + 50))  # 获取表情包id列表
-        ignore_ids = self.SCAN_CONFIG['ignore']  # 需要忽略的id
-        ids = [id_ for id_ in ids if id_ not in ignore_ids]  # 删除不必要的id
-        for i in range(0, len(ids), self.SCAN_CONFIG['step']):  # 分批获取表情包信息
-            id_list = ids[i:i + self.SCAN_CONFIG['step']]
-            emojis_info = self.get_emoji_info(id_list)  # 批量获取表情包信息
-            for emoji_info in emojis_info:
-                self.save_emoji_info(emoji_info)  # 逐个保存表情包信息
+        max_workers = self.SCAN_CONFIG.get('batch_concurrency', 4)  # 同时进行的批量请求数
+        pos = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = set()
+            while pos < len(ids) or futures:
+                while pos < len(ids) and len(futures) < max_workers:  # 按当前批量大小补充任务
+                    size = sizer.next_size()
+                    futures.add(executor.submit(self._scan_batch, ids[pos:pos + size], sizer))
+                    pos += size
+                done, futures = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        future.result()
+                    except Exception as e:
+                        print(f"[ERROR] 线程任务失败: {e}")
 
 
 if __name__ == "__main__":
-    BiliEmoji = BiliEmoji()
-    BiliEmoji.main()  # 主函数调用
+    parser = argparse.ArgumentParser(description='扫描B站表情包')
+    parser.add_argument('--incremental', action='store_true', help='根据扫描状态索引增量扫描')
+    parser.add_argument('--listing', action='store_true', help='根据 AllPackages 列表只扫描新增或有变化的表情包')
+    parser.add_argument('--resume', action='store_true', help='从上次中断的断点继续扫描')
+    parser.add_argument('--shard', help='只扫描第 k 个分片（共 n 个，按 ID 取模），格式 k/n，例如 3/8')
+    parser.add_argument('--range', dest='id_range', help='只扫描该区间内的ID，格式 起始-结束，例如 1-5000')
+    parser.add_argument('--reconcile', action='store_true', help='清理改名遗留的重复文件后退出')
+    args = parser.parse_args()
+
+    BiliEmoji = BiliEmoji(shard=ShardSpec.parse(args.shard, args.id_range))
+    if args.incremental:
+        BiliEmoji.SCAN_CONFIG['incremental'] = True
+    if args.listing:
+        BiliEmoji.SCAN_CONFIG['listing'] = True
+    if args.resume:
+        BiliEmoji.SCAN_CONFIG['resume'] = True
+    if args.reconcile:
+        BiliEmoji.reconcile()
+    else:
+        BiliEmoji.main()  # 主函数调用
@@ -1,40 +1,45 @@
 # -*- coding: UTF-8 -*-
 import requests
-import json
 import time
-import os
 import threading
+import argparse
+import asyncio
 import concurrent.futures
 from requests.exceptions import RequestException
 
 
-from bilibili_auth import BilibiliAuth, appsign
+from bilibili_auth import appsign
+from http_cache import cached_get
+from metrics import METRICS
+from retry_policy import parse_retry_after
+from scanner_base import BaseBiliEmoji
+from sharding import ShardSpec
 
 
-class BiliEmoji:
+class BiliEmoji(BaseBiliEmoji):
     """
-    用于获取B站表情包信息并保存的工具类
+    用于获取B站表情包信息并保存的工具类，通过 PackageDetail 逐个获取
     """
 
-    def __init__(self):
-        # 初始化配置和认证信息
-        self.PROXY = json.loads(os.getenv('PROXY', '{}'))  # 代理配置
-        self.SCAN_CONFIG = json.loads(os.getenv('SCAN_CONFIG', '{"start": 1, "end": 10000, "step": 40, "ignore": [4, 250]}'))  # 扫描配置
-
-        self.ACCOUNT = int(os.getenv('ACCOUNT', 1))  # 账号ID
-        self.AUTH = BilibiliAuth(os.getenv('ACCOUNT_DB_URI', 'mongodb://localhost:27017/'))  # 认证模块
-        self.ACCESS_KEY, self.COOKIE = self.AUTH.get_access(self.ACCOUNT)  # 获取访问密钥和Cookie
-
+    def __init__(self, auth=None, shard: ShardSpec = None):
+        """
+        初始化配置和认证信息
+        :param auth: 认证模块，需提供 get_access(mid)；默认使用 BilibiliAuth 连接 ACCOUNT_DB_URI
+        :param shard: 分片，只扫描属于该分片的ID，结果写入 partial/<分片名>/，再由 merge_shards.py 合并到 list/
+        """
+        super().__init__(auth, shard)
         self.s = requests.Session()
         self.local = threading.local()
 
-    def get_emoji_info(self, id, session=None, retry=3):
+    def _build_detail_request(self, id):
         """
-        获取表情包信息，增加重试机制。
+        构造 PackageDetail 请求
+        :param id: 表情包ID
+        :return: (url, 签名后的参数, 请求头)
         """
-        url = 'https://api.bilibili.com/bapis/main.community.interface.emote.EmoteService/PackageDetail'
+        url = f'{self.API_BASE}/bapis/main.community.interface.emote.EmoteService/PackageDetail'
         params = {
-            'access_key': '',  # 或 self.ACCESS_KEY
+            'access_key': '',  # 或 self.ACCOUNTS.acquire().access_key
             'build': 8230800,
             'business': 'reply',
             'channel': 'master',
@@ -48,7 +53,7 @@ class BiliEmoji:
         sign_params = appsign(params, 'bb3101000e232e27', '36efcfed79309338ced0380abd824ac1')
         headers = {
             'native_api_from': 'h5',
-            'cookie': '',  # 或 self.COOKIE
+            'cookie': '',  # 或对应账号的 cookie
             'accept': 'application/json, text/plain, */*',
             'referer': f'https://www.bilibili.com/h5/mall/emoji-package/detail/{id}?navhide=1&native.theme=0',
             'content-type': 'application/json',
@@ -56,133 +61,64 @@ class BiliEmoji:
             'bili-http-engine': 'cronet',
             'accept-encoding': 'gzip, deflate, br',
         }
+        return url, sign_params, headers
 
-        for attempt in range(retry):
-            try:
-                s = session or self.s
-                response = s.get(url, params=sign_params, headers=headers, timeout=10)
-                if response.status_code == 200:
-                    res = response.json()
-                    if res['code'] == 0:
-                        data = res.get('data', {})
-                        package = data.get('package')
-                        if package:
-                            return self._parse_package(package)
-                        else:
-                            return None
-                    else:
-                        print(f"[ERROR] 表情包ID {id} 获取失败: {res['message']}")
-                break  # 非200响应不重试
-            except RequestException as e:
-                print(f"[WARN] 获取ID {id} 失败，重试 {attempt + 1}/3，错误: {e}")
-                time.sleep(1)
-        return None
+    def get_emoji_info(self, id, session=None, retry=None):
+        """
+        获取并解析表情包信息
+        :param id: 表情包ID
+        :param session: requests 会话，默认使用共享会话
+        :param retry: 最大尝试次数，默认使用重试策略的配置
+        :return: 解析后的表情包字典；不存在或失败时返回 None
+        """
+        package = self._fetch_package(id, session, retry)
+        return self._parse_package(package) if package else None
 
-    @staticmethod
-    def _parse_package(package: dict) -> dict:
+    @METRICS.timed('get_emoji_info_seconds')
+    def _fetch_package(self, id, session=None, retry=None):
         """
-        解析单个表情包信息
-        :param package: 表情包数据
-        :return: 解析后的表情包字典
+        请求 PackageDetail 获取表情包原始数据，临时错误按重试策略退避重试，限流时打开熔断器暂停所有请求
+        多次重试仍失败的ID进入 RETRY_QUEUE，在本次运行结束前统一重试
+        :param id: 表情包ID
+        :param session: requests 会话，默认使用共享会话
+        :param retry: 最大尝试次数，默认使用重试策略的配置
+        :return: 接口返回的表情包数据；不存在或失败时返回 None
         """
-        package_dict = {
-            'id': package['id'],
-            'text': package['text'],
-            'icon': package['url'].replace('http://', 'https://'),
-            'resource_type': package.get('resource_type', 0),
-        }
-        if 'emotes' in package:
-            emotes = []
-            for emote in package['emotes']:
-                emote_data = {
-                    'text': emote['text'].replace('[', '').replace(']', ''),
-                    'url': emote['url'].replace('http://', 'https://'),
-                }
-                if 'gif_url' in emote:  # 动态表情
-                    emote_data['gif_url'] = emote['gif_url'].replace('http://', 'https://')
-                if 'webp_url' in emote:
-                    emote_data['webp_url'] = emote['webp_url'].replace('http://', 'https://')
-                emotes.append(emote_data)
-            package_dict['emote'] = emotes
-        return package_dict
-
-    @staticmethod
-    def save_emoji_info(emoji_info: dict):
-        """
-        保存表情包信息到本地文件
-        :param emoji_info: 表情包信息字典
-        """
-        emoji_id = emoji_info['id']
-        emoji_text = emoji_info['text']
-        filename = f'{emoji_id}-{emoji_text}.json'
-        filepath = os.path.join('list', filename)
-        os.makedirs('list', exist_ok=True)  # 确保目录存在
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(json.dumps(emoji_info, ensure_ascii=False, indent=2))
-
-    def get_latest_emoji_id(self) -> int:
-        """
-        获取最新的表情包ID
-        :return: 最新表情包ID；失败时返回 SCAN_CONFIG['end']
-        """
-        try:
-            base_url = 'https://api.bilibili.com/bapis/main.community.interface.emote.EmoteService/AllPackages'
-            ts = int(time.time())
-
-            params = {
-                'access_key': self.ACCESS_KEY,
-                'build': 8230800,
-                'business': 'reply',
-                'channel': 'master',
-                'disable_rcmd': 0,
-                'mobi_app': 'android_i',
-                'platform': 'android',
-                'pn': 1,
-                'ps': 100,
-                'search': '',
-                'statistics': '{"appId":14,"platform":3,"version":"3.20.4","abtest":""}',
-                'ts': ts
-            }
-
-            headers = {
-                'native_api_from': 'h5',
-                'cookie': self.COOKIE,
-                'accept': 'application/json, text/plain, */*',
-                'referer': 'https://www.bilibili.com/h5/mall/emoji-package/more?navhide=1&native.theme=0',
-                'content-type': 'application/json',
-                'user-agent': (
-                    'Mozilla/5.0 (Linux; Android 13; Mi 10 Build/TKQ1.221114.001; wv) '
-                    'AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/135.0.7049.111 '
-                    'Mobile Safari/537.36 os/android model/Mi 10 build/8230800 osVer/13 sdkInt/33 '
-                    'network/2 BiliApp/8230800 mobi_app/android_i channel/master innerVer/8230800 '
-                    'c_locale/zh_CN s_locale/zh_CN disable_rcmd/0 themeId/0 sh/33 3.20.4'
-                ),
-                'bili-http-engine': 'cronet',
-                'accept-encoding': 'gzip, deflate, br'
-            }
-
-            signed_params = appsign(params, 'bb3101000e232e27', '36efcfed79309338ced0380abd824ac1')
-            res1 = requests.get(base_url, params=signed_params, headers=headers, proxies=self.PROXY).json()
-
-            if res1.get('code') != 0:
-                print(f"[ERROR] 初次请求失败: {res1.get('message')}")
-                return self.SCAN_CONFIG['end']
-
-            total = res1.get('data', {}).get('total', 0)
-            params['pn'] = total // 100 + 1
-            params['ts'] = int(time.time())  # 更新时间戳
-            signed_params = appsign(params, 'bb3101000e232e27', '36efcfed79309338ced0380abd824ac1')
-            res = requests.get(base_url, params=signed_params, headers=headers, proxies=self.PROXY).json()
-
-            if res.get('code') == 0 and 'packages' in res['data']:
-                return max(*(pkg['id'] for pkg in res['data']['packages']), *(pkg['id'] for pkg in res1['data']['packages']))
-            else:
-                print(f"[ERROR] 获取最后一页失败: {res.get('message')}")
-                return self.SCAN_CONFIG['end']
+        url, sign_params, headers = self._build_detail_request(id)
+        attempts = retry or self.RETRY.attempts
 
-        except Exception as e:
-            print(f"[ERROR] 获取最新表情包ID异常: {e}")
-            return self.SCAN_CONFIG['end']
+        for attempt in range(attempts):
+            self.BREAKER.wait()
+            retry_after = None
+            try:
+                s = session or self.s
+                response, res = cached_get(self.HTTP_CACHE, s.get, 'PackageDetail', url, sign_params, headers, timeout=10)
+            except RequestException as e:
+                kind, reason = 'transient', e
+            else:
+                code = res.get('code') if isinstance(res, dict) else None
+                kind = self.RETRY.classify(response.status_code, code)
+                reason = f"HTTP {response.status_code}, code {code}"
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+
+            if kind == 'ok':
+                self.BREAKER.record_success()
+                package = res.get('data', {}).get('package')
+                if package:
+                    return package
+                self.STATE.record_empty(id)
+                return None
+            if kind == 'permanent':
+                message = res.get('message') if isinstance(res, dict) else reason
+                print(f"[ERROR] 表情包ID {id} 获取失败: {message}")
+                return None
+            if kind == 'throttle':
+                self.BREAKER.record_throttle(retry_after)
+            print(f"[WARN] 获取ID {id} 失败，重试 {attempt + 1}/{attempts}，错误: {reason}")
+            METRICS.inc('retries', endpoint='PackageDetail')
+            time.sleep(self.RETRY.backoff(attempt, retry_after))
+        self.RETRY_QUEUE.add(id)
+        return None
 
     def get_thread_session(self):
         if not hasattr(self.local, 'session'):
@@ -191,20 +127,37 @@ class BiliEmoji:
 
     def _worker(self, id):
         session = self.get_thread_session()  # 每个线程使用自己的 session
-        emoji_info = self.get_emoji_info(id, session)
-        if emoji_info:
-            self.save_emoji_info(emoji_info)
+        package = self._fetch_package(id, session)
+        if package:
+            self.PIPELINE.put(id, package)  # 解析与保存交给流水线，写入跟不上时在此阻塞
+        elif id not in self.RETRY_QUEUE:  # 确认不存在
+            self.CHECKPOINT.mark_done(id)
+
+    def reconcile(self):
+        """
+        清理同一表情包ID对应的多个文件：重新获取这些ID并保存，保存时会删除过期的文件
+        """
+        ids = self.WRITER.duplicates()
+        print(f"[INFO] 发现 {len(ids)} 个重复的表情包ID: {ids}")
+        for id_ in ids:
+            emoji_info = self.get_emoji_info(id_)
+            if emoji_info:
+                self.save_emoji_info(emoji_info)
+            else:
+                print(f"[WARN] 表情包ID {id_} 获取失败或已不存在，保留原有文件")
 
     def main(self):
         """
-        主函数，使用多线程并发获取表情包信息并保存
+        主函数，使用多线程并发获取表情包信息，经流水线解析并保存
         """
-        end_id = self.get_latest_emoji_id()
-        ids = list(range(self.SCAN_CONFIG['start'], end_id + 50))
-        ignore_ids = self.SCAN_CONFIG['ignore']
-        ids = [id_ for id_ in ids if id_ not in ignore_ids]
+        self._scan(self._run_pool)
 
-        max_workers = 20  # 线程数
+    def _run_pool(self, ids):
+        """
+        使用线程池获取并保存给定的表情包ID
+        :param ids: 表情包ID列表
+        """
+        max_workers = self.SCAN_CONFIG.get('threads', 20)  # 获取线程数
         with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
             futures = [executor.submit(self._worker, id_) for id_ in ids]
             for future in concurrent.futures.as_completed(futures):
@@ -213,7 +166,42 @@ class BiliEmoji:
                 except Exception as e:
                     print(f"[ERROR] 线程任务失败: {e}")
 
+    def main_async(self):
+        """
+        主函数，使用 asyncio 并发获取表情包信息，经流水线解析并保存
+        并发数与限速分别由 SCAN_CONFIG['concurrency'] 和 SCAN_CONFIG['rps'] 控制
+        """
+        from async_scan import AsyncScanner  # 仅异步模式需要 aiohttp
+
+        scanner = AsyncScanner(
+            self,
+            concurrency=self.SCAN_CONFIG.get('concurrency', 50),
+            rps=self.SCAN_CONFIG.get('rps', 0)
+        )
+        self._scan(lambda ids: asyncio.run(scanner.run(ids)))
+
 
 if __name__ == "__main__":
-    BiliEmoji = BiliEmoji()
-    BiliEmoji.main()  # 主函数调用
+    parser = argparse.ArgumentParser(description='扫描B站表情包')
+    parser.add_argument('--async', dest='use_async', action='store_true', help='使用 asyncio 扫描模式')
+    parser.add_argument('--incremental', action='store_true', help='根据扫描状态索引增量扫描')
+    parser.add_argument('--listing', action='store_true', help='根据 AllPackages 列表只扫描新增或有变化的表情包')
+    parser.add_argument('--resume', action='store_true', help='从上次中断的断点继续扫描')
+    parser.add_argument('--shard', help='只扫描第 k 个分片（共 n 个，按 ID 取模），格式 k/n，例如 3/8')
+    parser.add_argument('--range', dest='id_range', help='只扫描该区间内的ID，格式 起始-结束，例如 1-5000')
+    parser.add_argument('--reconcile', action='store_true', help='清理改名遗留的重复文件后退出')
+    args = parser.parse_args()
+
+    BiliEmoji = BiliEmoji(shard=ShardSpec.parse(args.shard, args.id_range))
+    if args.incremental:
+        BiliEmoji.SCAN_CONFIG['incremental'] = True
+    if args.listing:
+        BiliEmoji.SCAN_CONFIG['listing'] = True
+    if args.resume:
+        BiliEmoji.SCAN_CONFIG['resume'] = True
+    if args.reconcile:
+        BiliEmoji.reconcile()
+    elif args.use_async:
+        BiliEmoji.main_async()
+    else:
+        BiliEmoji.main()  # 主函数调用
@@ -0,0 +1,87 @@
+# -*- coding: UTF-8 -*-
+import argparse
+import os
+import shutil
+import sys
+
+from catalogue import load_packages
+from change_feed import ChangeFeed
+from output import EmojiWriter
+from scan_state import ScanState, package_digest
+from sharding import PARTIAL_DIR
+
+
+def find_shards(partial_dir=PARTIAL_DIR) -> list:
+    """
+    :param partial_dir: 分片结果的根目录
+    :return: 按名称排序的分片目录列表
+    """
+    if not os.path.isdir(partial_dir):
+        return []
+    return [os.path.join(partial_dir, name) for name in sorted(os.listdir(partial_dir))
+            if os.path.isdir(os.path.join(partial_dir, name, 'list'))]
+
+
+def merge_shards(shard_dirs: list, list_dir='list', state_path='scan_state.json', change_feed: ChangeFeed = None) -> tuple:
+    """
+    将各分片的结果合并到 list/ 与扫描状态中
+    同一ID在多个分片中内容不同，或在某个分片中存在多个文件时视为冲突，不写入该ID，保留 list/ 中原有的文件
+    :param shard_dirs: 分片目录列表
+    :param list_dir: 表情包输出目录
+    :param state_path: 扫描状态文件路径
+    :param change_feed: 变更记录，合并时记录写入 list/ 的表情包的变更，None 表示不记录
+    :return: (EmojiWriter, 冲突的ID到分片目录列表的字典)
+    """
+    found = {}  # id -> [(分片目录, 表情包)]
+    conflicts = {}
+    for shard_dir in shard_dirs:
+        ambiguous = {}
+        for package in load_packages(os.path.join(shard_dir, 'list'), ambiguous):
+            found.setdefault(package['id'], []).append((shard_dir, package))
+        for id_ in ambiguous:
+            conflicts.setdefault(id_, []).append(shard_dir)
+
+    writer = EmojiWriter(list_dir)
+    if change_feed:
+        writer.listeners.append(change_feed.record)
+    for id_ in sorted(found):
+        candidates = found[id_]
+        if id_ in conflicts or len({package_digest(package) for _, package in candidates}) > 1:
+            conflicts[id_] = sorted(set(conflicts.get(id_, [])) | {shard_dir for shard_dir, _ in candidates})
+            continue
+        writer.save(candidates[0][1])
+
+    state = ScanState(state_path)
+    shard_states = [os.path.join(shard_dir, 'scan_state.json') for shard_dir in shard_dirs]
+    shard_states = [path for path in shard_states if os.path.exists(path)]
+    for path in shard_states:
+        state.merge(ScanState(path))
+    if shard_states:
+        state.save()
+    return writer, conflicts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='合并分片扫描的结果到 list/')
+    parser.add_argument('--partial-dir', default=PARTIAL_DIR, help='分片结果的根目录')
+    parser.add_argument('--list-dir', default='list', help='表情包输出目录')
+    parser.add_argument('--state', default=os.getenv('SCAN_STATE', 'scan_state.json'), help='扫描状态文件路径')
+    parser.add_argument('--change-feed', action='store_true', help='记录合并产生的变更（同 SCAN_CONFIG 的 change_feed）')
+    parser.add_argument('--keep', action='store_true', help='合并后保留分片目录')
+    args = parser.parse_args()
+
+    shards = find_shards(args.partial_dir)
+    if not shards:
+        print(f"[ERROR] {args.partial_dir} 中没有分片结果")
+        sys.exit(1)
+    feed = ChangeFeed(os.getenv('CHANGE_DIR', 'changes')) if args.change_feed else None
+    writer, conflicts = merge_shards(shards, args.list_dir, args.state, feed)
+    print(f"[INFO] 合并 {len(shards)} 个分片: {writer.summary()}")
+    if feed:
+        print(f"[INFO] 变更记录: {feed.flush()['message']}")
+    if conflicts:
+        for id_, dirs in sorted(conflicts.items()):
+            print(f"[ERROR] 表情包ID {id_} 在多个分片中内容不一致或存在多个文件: {', '.join(dirs)}")
+        sys.exit(1)  # 保留分片目录以便排查
+    if not args.keep:
+        shutil.rmtree(args.partial_dir)
@@ -0,0 +1,207 @@
+# -*- coding: UTF-8 -*-
+import functools
+import json
+import threading
+import time
+
+from output import atomic_write
+
+# 耗时直方图的桶上界（秒）
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """
+    固定分桶的耗时直方图
+    """
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)  # 最后一个桶为 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        i = 0
+        while i < len(BUCKETS) and value > BUCKETS[i]:
+            i += 1
+        self.buckets[i] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """
+        估算分位数（取所在桶的上界）
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return BUCKETS[i] if i < len(BUCKETS) else self.max
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'mean': round(self.sum / self.count, 6) if self.count else 0.0,
+            'p50': self.quantile(0.5),
+            'p99': self.quantile(0.99),
+            'max': round(self.max, 6),
+        }
+
+
+class Metrics:
+    """
+    运行级指标：耗时直方图与带标签的计数器，多线程并发调用是安全的
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.histograms = {}  # (名称, 标签) -> Histogram
+        self.counters = {}  # (名称, 标签) -> 数值
+
+    def observe(self, name: str, seconds: float, **labels):
+        """
+        记录一次耗时
+        :param name: 指标名
+        :param seconds: 耗时（秒）
+        :param labels: 标签
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(seconds)
+
+    def inc(self, name: str, value=1, **labels):
+        """
+        计数器加一（或加 value）
+        :param name: 指标名
+        :param value: 增量
+        :param labels: 标签
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def timed(self, name: str):
+        """
+        装饰器：记录函数耗时
+        :param name: 指标名
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.monotonic()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(name, time.monotonic() - start)
+            return wrapper
+        return decorator
+
+    def record_request(self, endpoint: str, status, code, nbytes: int, seconds: float):
+        """
+        记录一次 HTTP 请求
+        :param endpoint: 接口名，例如 PackageDetail
+        :param status: HTTP 状态码，请求异常时为 'error'
+        :param code: 接口返回的 code，无法解析时为 None
+        :param nbytes: 响应体字节数
+        :param seconds: 请求耗时（秒）
+        """
+        self.observe('request_seconds', seconds, endpoint=endpoint)
+        self.inc('requests', endpoint=endpoint, status=str(status))
+        if code is not None:
+            self.inc('api_codes', endpoint=endpoint, code=str(code))
+        self.inc('response_bytes', nbytes, endpoint=endpoint)
+
+    @staticmethod
+    def _label_str(labels) -> str:
+        return ','.join(f'{k}={v}' for k, v in labels)
+
+    def summary(self) -> dict:
+        """
+        :return: 可序列化为 JSON 的运行摘要
+        """
+        with self.lock:
+            histograms = {}
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                histograms.setdefault(name, {})[self._label_str(labels)] = histogram.to_dict()
+            counters = {}
+            for (name, labels), value in sorted(self.counters.items()):
+                counters.setdefault(name, {})[self._label_str(labels)] = value
+        return {
+            'started': int(self.started),
+            'duration': round(time.time() - self.started, 3),
+            'timings': histograms,
+            'counters': counters,
+        }
+
+    def prometheus(self, prefix='biliemoji') -> str:
+        """
+        :return: Prometheus textfile 格式的指标
+        """
+        def fmt(labels, extra=()):
+            items = list(labels) + list(extra)
+            return '{' + ','.join(f'{k}="{v}"' for k, v in items) + '}' if items else ''
+
+        lines = [f'{prefix}_run_duration_seconds {time.time() - self.started:.3f}']
+        with self.lock:
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                metric = f'{prefix}_{name}' if name.endswith('_seconds') else f'{prefix}_{name}_seconds'
+                cumulative = 0
+                for bound, n in zip(list(BUCKETS) + ['+Inf'], histogram.buckets):
+                    cumulative += n
+                    lines.append(f'{metric}_bucket{fmt(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{metric}_sum{fmt(labels)} {histogram.sum:.6f}')
+                lines.append(f'{metric}_count{fmt(labels)} {histogram.count}')
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f'{prefix}_{name}_total{fmt(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def emit(self, json_path=None, prom_path=None):
+        """
+        输出运行摘要：写入 json_path，未指定时打印到标准输出；指定 prom_path 时同时写入 Prometheus textfile
+        :param json_path: JSON 摘要文件路径
+        :param prom_path: Prometheus textfile 路径
+        """
+        summary = json.dumps(self.summary(), ensure_ascii=False)
+        if json_path:
+            atomic_write(json_path, summary.encode('utf-8'))
+        else:
+            print(f"[METRICS] {summary}")
+        if prom_path:
+            atomic_write(prom_path, self.prometheus().encode('utf-8'))
+
+
+METRICS = Metrics()  # 全局指标
+
+
+def timed_get(get, endpoint: str, url: str, **kwargs) -> tuple:
+    """
+    发送 GET 请求并记录请求指标
+    :param get: requests.get 或 Session.get
+    :param endpoint: 接口名
+    :param url: 请求地址
+    :param kwargs: 传给 get 的其他参数
+    :return: (响应, 解析后的 JSON；响应不是 JSON 时为 None)
+    """
+    start = time.monotonic()
+    try:
+        response = get(url, **kwargs)
+    except Exception:
+        METRICS.record_request(endpoint, 'error', None, 0, time.monotonic() - start)
+        raise
+    try:
+        res = response.json()
+    except ValueError:
+        res = None
+    code = res.get('code') if isinstance(res, dict) else None
+    METRICS.record_request(endpoint, response.status_code, code, len(response.content), time.monotonic() - start)
+    return response, res
@@ -0,0 +1,156 @@
+# -*- coding: UTF-8 -*-
+import json
+import os
+import tempfile
+import threading
+
+
+def atomic_write(filepath: str, data: bytes, mode=0o644):
+    """
+    先写入同目录下的临时文件再替换目标文件，避免产生写了一半的文件
+    :param filepath: 目标文件路径
+    :param data: 文件内容
+    :param mode: 文件权限
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(filepath) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        if mode != 0o600:  # mkstemp 默认权限为 0600
+            os.chmod(tmp_path, mode)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_if_changed(filepath: str, data: bytes) -> bool:
+    """
+    内容与现有文件不同时才原子写入
+    :param filepath: 目标文件路径
+    :param data: 文件内容
+    :return: 是否发生了写入
+    """
+    try:
+        with open(filepath, 'rb') as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+    atomic_write(filepath, data)
+    return True
+
+
+class EmojiWriter:
+    """
+    表情包文件输出层：内容未变化时跳过写入，变化时原子替换，并统计新增、更新与未变化的数量
+    启动时建立 ID→文件名 索引，表情包改名时同时删除旧文件（remove_stale 为 False 时保留）
+    listeners 中的回调会在表情包新增或更新后以 (表情包信息, 状态, 原有的表情包信息, 删除的旧文件名列表) 调用，
+    新增时原有信息为 None
+    多线程并发调用 save 是安全的
+    """
+
+    def __init__(self, out_dir='list', remove_stale=True):
+        """
+        初始化输出层
+        :param out_dir: 输出目录
+        :param remove_stale: 是否删除同一ID的其他文件；名称不是来自接口时（如由数据库导出）应保留，交给 --reconcile 处理
+        """
+        self.out_dir = out_dir
+        self.remove_stale = remove_stale
+        os.makedirs(out_dir, exist_ok=True)  # 确保目录存在
+        self.lock = threading.Lock()
+        self.counts = {'added': 0, 'changed': 0, 'unchanged': 0}
+        self.index = self._build_index()
+        self.listeners = []
+
+    def _build_index(self) -> dict:
+        """
+        扫描输出目录，建立 ID→文件名集合 的索引
+        :return: 索引字典
+        """
+        index = {}
+        for filename in os.listdir(self.out_dir):
+            id_, sep, _ = filename.partition('-')
+            if sep and id_.isdigit() and filename.endswith('.json'):
+                index.setdefault(int(id_), set()).add(filename)
+        return index
+
+    def duplicates(self) -> list:
+        """
+        :return: 存在多个文件的表情包ID列表
+        """
+        with self.lock:
+            return sorted(id_ for id_, filenames in self.index.items() if len(filenames) > 1)
+
+    @staticmethod
+    def serialize(emoji_info: dict) -> bytes:
+        """
+        序列化表情包信息，格式与仓库中已有文件一致
+        :param emoji_info: 表情包信息字典
+        :return: 文件内容
+        """
+        return json.dumps(emoji_info, ensure_ascii=False, indent=2).encode('utf-8')
+
+    def filename(self, emoji_info: dict) -> str:
+        """
+        :param emoji_info: 表情包信息字典
+        :return: 表情包对应的文件名
+        """
+        return f"{emoji_info['id']}-{emoji_info['text']}.json"
+
+    def save(self, emoji_info: dict) -> str:
+        """
+        保存表情包信息
+        :param emoji_info: 表情包信息字典
+        :return: 'added'、'changed' 或 'unchanged'
+        """
+        filename = self.filename(emoji_info)
+        filepath = os.path.join(self.out_dir, filename)
+        data = self.serialize(emoji_info)
+        try:
+            with open(filepath, 'rb') as f:
+                old = f.read()
+        except FileNotFoundError:
+            old = None
+
+        if old == data:
+            status = 'unchanged'
+        else:
+            atomic_write(filepath, data)
+            status = 'added' if old is None else 'changed'
+
+        with self.lock:
+            stale = self.index.get(emoji_info['id'], set()) - {filename}
+            if self.remove_stale:
+                self.index[emoji_info['id']] = {filename}
+            else:
+                self.index.setdefault(emoji_info['id'], set()).add(filename)
+                stale = set()
+        removed = []
+        for stale_name in sorted(stale):  # 表情包改名，删除旧文件
+            try:
+                if old is None and self.listeners:  # 旧文件中的内容作为原有信息
+                    with open(os.path.join(self.out_dir, stale_name), 'rb') as f:
+                        old = f.read()
+                os.remove(os.path.join(self.out_dir, stale_name))
+                removed.append(stale_name)
+            except FileNotFoundError:
+                pass
+            print(f"[INFO] 表情包ID {emoji_info['id']} 改名，删除旧文件 {stale_name}")
+        if stale:
+            status = 'changed'
+
+        with self.lock:
+            self.counts[status] += 1
+        if status != 'unchanged' and self.listeners:
+            previous = json.loads(old) if old is not None else None
+            for listener in self.listeners:
+                listener(emoji_info, status, previous, removed)
+        return status
+
+    def summary(self) -> str:
+        """
+        :return: 本次运行的写入统计
+        """
+        return f"新增 {self.counts['added']}，更新 {self.counts['changed']}，未变化 {self.counts['unchanged']}"
@@ -0,0 +1,91 @@
+# -*- coding: UTF-8 -*-
+import queue
+import threading
+
+from metrics import METRICS
+
+_STOP = object()  # 通知下游阶段结束
+
+
+class Pipeline:
+    """
+    分阶段处理流水线：获取 → 解析 → 写入
+    获取阶段由调用方的线程或协程通过 put() 提交原始数据；解析阶段由若干线程执行；写入阶段由单个线程批量执行
+    各阶段之间为有界队列，下游处理不过来时 put() 会阻塞，使获取阶段自动放慢，内存占用保持平稳
+    """
+
+    def __init__(self, parse, write, queue_size=1000, parse_workers=1, write_batch=100, on_parse_error=None):
+        """
+        启动解析与写入线程
+        :param parse: 解析函数，参数为原始数据，返回解析结果
+        :param write: 写入函数，参数为 [(ID, 解析结果)] 列表，只会在写入线程中调用
+        :param queue_size: 每个队列的容量
+        :param parse_workers: 解析线程数
+        :param write_batch: 写入线程每批处理的最大数量
+        :param on_parse_error: 解析失败时调用，参数为表情包ID，用于将其加入失败队列
+        """
+        self.parse = parse
+        self.write = write
+        self.write_batch = write_batch
+        self.on_parse_error = on_parse_error
+        self.parse_queue = queue.Queue(queue_size)
+        self.write_queue = queue.Queue(queue_size)
+        self.parsers = [threading.Thread(target=self._parse_loop, daemon=True) for _ in range(parse_workers)]
+        self.writer = threading.Thread(target=self._write_loop, daemon=True)
+        for thread in self.parsers + [self.writer]:
+            thread.start()
+
+    def put(self, id_, raw):
+        """
+        提交一条原始数据，解析队列已满时阻塞
+        :param id_: 表情包ID
+        :param raw: 接口返回的原始表情包数据
+        """
+        self.parse_queue.put((id_, raw))
+
+    def _parse_loop(self):
+        while (item := self.parse_queue.get()) is not _STOP:
+            id_, raw = item
+            try:
+                self.write_queue.put((id_, self.parse(raw)))
+            except Exception as e:
+                METRICS.inc('pipeline_errors', stage='parse')
+                print(f"[ERROR] 表情包ID {id_} 解析失败: {e}")
+                if self.on_parse_error:
+                    self.on_parse_error(id_)
+
+    def _write_loop(self):
+        stopped = False
+        while not stopped:
+            batch = []
+            item = self.write_queue.get()  # 阻塞等待第一条，之后取出队列中已有的数据凑成一批
+            while True:
+                if item is _STOP:
+                    stopped = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.write_batch:
+                    break
+                try:
+                    item = self.write_queue.get_nowait()
+                except queue.Empty:
+                    break
+            if not batch:
+                continue
+            METRICS.inc('write_batches')
+            try:
+                self.write(batch)
+            except Exception as e:
+                METRICS.inc('pipeline_errors', stage='write')
+                print(f"[ERROR] 写入 {len(batch)} 个表情包失败: {e}")
+
+    def close(self):
+        """
+        等待已提交的数据全部解析并写入，然后结束各阶段线程
+        """
+        for _ in self.parsers:
+            self.parse_queue.put(_STOP)
+        for thread in self.parsers:
+            thread.join()
+        self.write_queue.put(_STOP)
+        self.writer.join()
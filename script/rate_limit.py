@@ -0,0 +1,54 @@
+# -*- coding: UTF-8 -*-
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    令牌桶限速器，同时支持线程与 asyncio 调用
+    """
+
+    def __init__(self, rate: float, burst: int = None):
+        """
+        初始化令牌桶
+        :param rate: 每秒补充的令牌数（即每秒请求数上限），<= 0 表示不限速
+        :param burst: 桶容量（允许的突发请求数），默认与 rate 相同
+        """
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, int(rate)))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """
+        预定一个令牌
+        :return: 需要等待的秒数，0 表示可以立即发送
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1  # 允许透支，透支部分按速率折算为等待时间
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def acquire(self):
+        """
+        阻塞直到获得一个令牌（线程版本）
+        """
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """
+        等待直到获得一个令牌（asyncio 版本）
+        """
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
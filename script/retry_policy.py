@@ -0,0 +1,185 @@
+# -*- coding: UTF-8 -*-
+import asyncio
+import email.utils
+import random
+import threading
+import time
+
+THROTTLE_STATUS = {412, 429}  # 触发风控或请求过于频繁
+TRANSIENT_STATUS = THROTTLE_STATUS | {500, 502, 503, 504}
+THROTTLE_CODES = {-412, -509, -799}  # 请求被拦截、请求过于频繁
+TRANSIENT_CODES = THROTTLE_CODES | {-500, -502, -503, -504}  # 服务端临时错误
+
+
+class ThrottledError(Exception):
+    """
+    请求被限流
+    """
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TransientError(Exception):
+    """
+    可重试的临时错误（网络错误、5xx、服务端临时错误码）
+    """
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value):
+    """
+    解析 Retry-After 响应头
+    :param value: 响应头的值，秒数或 HTTP 日期
+    :return: 需要等待的秒数；无法解析时返回 None
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    重试策略：区分永久错误与临时错误，临时错误按带随机抖动的指数退避重试，并遵守 Retry-After
+    """
+
+    def __init__(self, attempts=3, base=1.0, cap=60.0):
+        """
+        :param attempts: 单次请求的最大尝试次数
+        :param base: 退避的基础时长（秒）
+        :param cap: 单次退避的最长时长（秒）
+        """
+        self.attempts = attempts
+        self.base = base
+        self.cap = cap
+
+    @staticmethod
+    def classify(status, code) -> str:
+        """
+        判断一次请求结果的类型
+        :param status: HTTP 状态码，请求异常时为 None
+        :param code: 接口返回的 code，无法解析时为 None
+        :return: 'ok'、'throttle'（限流）、'transient'（可重试）或 'permanent'（不可重试）
+        """
+        if status in THROTTLE_STATUS or code in THROTTLE_CODES:
+            return 'throttle'
+        if status is None or status in TRANSIENT_STATUS or code in TRANSIENT_CODES:
+            return 'transient'
+        if status != 200:
+            return 'permanent'
+        if code is None:  # 200 但响应不是合法 JSON
+            return 'transient'
+        return 'ok' if code == 0 else 'permanent'
+
+    def backoff(self, attempt: int, retry_after=None) -> float:
+        """
+        计算第 attempt 次失败后的等待时间（full jitter）
+        :param attempt: 已失败的次数，从 0 开始
+        :param retry_after: 服务端要求的等待秒数
+        :return: 等待秒数
+        """
+        delay = random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+class CircuitBreaker:
+    """
+    限流熔断器：任一请求被限流时，所有工作线程/协程暂停一段时间；连续限流时暂停时间翻倍，请求成功后恢复
+    """
+
+    def __init__(self, cooldown=5.0, max_cooldown=120.0):
+        """
+        :param cooldown: 首次限流时的暂停时长（秒）
+        :param max_cooldown: 最长暂停时长（秒）
+        """
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.open_until = 0.0
+        self.lock = threading.Lock()
+
+    def remaining(self) -> float:
+        """
+        :return: 距离恢复请求的剩余秒数
+        """
+        return max(0.0, self.open_until - time.monotonic())
+
+    def wait(self):
+        """
+        熔断期间阻塞等待（线程版本）
+        """
+        while (delay := self.remaining()) > 0:
+            time.sleep(delay)
+
+    async def wait_async(self):
+        """
+        熔断期间等待（asyncio 版本）
+        """
+        while (delay := self.remaining()) > 0:
+            await asyncio.sleep(delay)
+
+    def record_throttle(self, retry_after=None):
+        """
+        记录一次限流，打开熔断器
+        :param retry_after: 服务端要求的等待秒数
+        """
+        with self.lock:
+            now = time.monotonic()
+            if now >= self.open_until:  # 熔断期间的其他限流响应不再叠加
+                pause = max(self.cooldown, retry_after or 0)
+                self.open_until = now + pause
+                self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+                print(f"[WARN] 检测到限流，暂停所有请求 {pause:.1f} 秒")
+
+    def record_success(self):
+        """
+        记录一次成功请求，重置暂停时长
+        """
+        if self.cooldown != self.base_cooldown:
+            with self.lock:
+                self.cooldown = self.base_cooldown
+
+
+class RetryQueue:
+    """
+    失败ID队列，在本次运行结束前统一重试
+    """
+
+    def __init__(self, checkpoint=None):
+        """
+        :param checkpoint: 扫描断点，失败的ID同时记入断点，中断后续扫时优先重试
+        """
+        self.ids = set()
+        self.checkpoint = checkpoint
+        self.lock = threading.Lock()
+
+    def __contains__(self, id_):
+        return id_ in self.ids
+
+    def add(self, id_):
+        with self.lock:
+            self.ids.add(id_)
+        if self.checkpoint:
+            self.checkpoint.mark_failed(id_)
+
+    def drain(self) -> list:
+        """
+        取出并清空队列
+        :return: 排序后的失败ID列表
+        """
+        with self.lock:
+            ids, self.ids = sorted(self.ids), set()
+        return ids
@@ -0,0 +1,178 @@
+# -*- coding: UTF-8 -*-
+import hashlib
+import json
+import os
+import threading
+import time
+
+from output import atomic_write
+
+
+def package_digest(emoji_info: dict) -> str:
+    """
+    计算表情包内容摘要
+    :param emoji_info: 解析后的表情包字典
+    :return: 16 位十六进制摘要
+    """
+    data = json.dumps(emoji_info, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(data.encode()).hexdigest()[:16]
+
+
+class ScanState:
+    """
+    扫描状态索引，记录每个表情包ID的内容摘要、最后获取时间与最后变更时间
+
+    文件格式（紧凑 JSON）：
+    {"run": 运行次数, "latest_id": 上次发现的最大ID, "ids": {"<id>": [摘要或 null, 最后获取时间, 最后变更时间]},
+     "listing": {"<id>": AllPackages 列表中该表情包的摘要}}
+    摘要为 null 表示该ID上次获取时不存在表情包
+    """
+
+    def __init__(self, path='scan_state.json'):
+        """
+        加载扫描状态
+        :param path: 状态文件路径
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.run = 0
+        self.latest_id = 0
+        self.ids = {}
+        self.listing = {}
+        self.pending_listing = {}  # 本次列表中有变化、尚未成功获取详情的表情包摘要
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.run = data.get('run', 0)
+            self.latest_id = data.get('latest_id', 0)
+            self.ids = {int(k): v for k, v in data.get('ids', {}).items()}
+            self.listing = {int(k): v for k, v in data.get('listing', {}).items()}
+
+    def _changed_at(self, entry, changed, now) -> int:
+        """
+        计算最后变更时间；首次建立索引时（run 为 0）出现的ID不视为近期变更
+        """
+        if entry is None:
+            return now if self.run else 0
+        return now if changed else entry[2]
+
+    def record(self, id, emoji_info: dict) -> bool:
+        """
+        记录一次成功获取的表情包
+        :param id: 表情包ID
+        :param emoji_info: 解析后的表情包字典
+        :return: 内容是否与上次不同
+        """
+        digest = package_digest(emoji_info)
+        now = int(time.time())
+        with self.lock:
+            entry = self.ids.get(id)
+            changed = entry is None or entry[0] != digest
+            self.ids[id] = [digest, now, self._changed_at(entry, changed, now)]
+            if id in self.pending_listing:
+                self.listing[id] = self.pending_listing.pop(id)
+        return changed
+
+    def record_empty(self, id):
+        """
+        记录该ID当前不存在表情包，最后变更时间为首次确认为空的时间，用于计算重新探测的退避间隔
+        :param id: 表情包ID
+        """
+        now = int(time.time())
+        with self.lock:
+            entry = self.ids.get(id)
+            if entry is None or entry[0] is not None:  # 新出现的空ID或表情包被删除，退避从最短间隔开始
+                changed_at = now
+            else:  # 持续为空；旧版本首次建立索引时记为 0，以上次探测时间作为起点
+                changed_at = entry[2] or entry[1]
+            self.ids[id] = [None, now, changed_at]
+
+    def snapshot(self, id) -> list:
+        """
+        :param id: 表情包ID
+        :return: 该ID的记录与列表摘要，写入扫描断点，中断后由 restore() 恢复
+        """
+        with self.lock:
+            return [self.ids.get(id), self.listing.get(id)]
+
+    def restore(self, id, snapshot: list):
+        """
+        恢复 snapshot() 返回的记录
+        :param id: 表情包ID
+        :param snapshot: [记录, 列表摘要]
+        """
+        entry, listing = snapshot
+        with self.lock:
+            if entry:
+                self.ids[id] = entry
+            if listing:
+                self.listing[id] = listing
+
+    def max_package_id(self) -> int:
+        """
+        :return: 已知存在的最大表情包ID，无记录时返回 0
+        """
+        with self.lock:
+            return max((id_ for id_, entry in self.ids.items() if entry[0] is not None), default=0)
+
+    def select(self, ids, rotation=8, recent_days=3) -> list:
+        """
+        增量扫描：从候选ID中挑选本次需要获取的ID
+        包括：从未获取过的ID、超过已知最大ID的ID、近期有变化的ID，以及按运行次数轮转的一部分旧ID
+        :param ids: 候选表情包ID列表
+        :param rotation: 轮转周期，每个旧ID每 rotation 次运行至少获取一次
+        :param recent_days: 最近变更的判定天数
+        :return: 需要获取的表情包ID列表
+        """
+        max_id = self.max_package_id()
+        recent = int(time.time()) - recent_days * 86400
+        slot = self.run % rotation
+        with self.lock:
+            return [
+                id_ for id_ in ids
+                if id_ not in self.ids
+                or id_ > max_id
+                or self.ids[id_][2] >= recent
+                or id_ % rotation == slot
+            ]
+
+    def select_listing(self, packages: list) -> list:
+        """
+        列表驱动扫描：比较 AllPackages 列表中每个表情包的摘要与上次记录的摘要
+        摘要在该ID的详情成功获取并 record() 后才会保存，获取失败的ID下次仍会被选中
+        :param packages: AllPackages 列表中的表情包
+        :return: 新出现、摘要有变化或上次确认为空的ID
+        """
+        with self.lock:
+            for package in packages:
+                id_, digest = package['id'], package_digest(package)
+                entry = self.ids.get(id_)
+                if self.listing.get(id_) != digest or entry is None or entry[0] is None:
+                    self.pending_listing[id_] = digest
+            return sorted(self.pending_listing)
+
+    def merge(self, other: 'ScanState'):
+        """
+        合并分片扫描保存的状态：每个ID取最后获取时间较新的记录（连同其列表摘要）
+        :param other: 分片的扫描状态，分片保存时已计入本次运行
+        """
+        with self.lock:
+            for id_, entry in other.ids.items():
+                if id_ not in self.ids or entry[1] > self.ids[id_][1]:
+                    self.ids[id_] = entry
+                    if id_ in other.listing:
+                        self.listing[id_] = other.listing[id_]
+            for id_, digest in other.listing.items():
+                self.listing.setdefault(id_, digest)
+            self.latest_id = max(self.latest_id, other.latest_id)
+            self.run = max(self.run, other.run - 1)
+
+    def save(self):
+        """
+        保存扫描状态（先写临时文件再替换，避免中途退出导致文件损坏），只在扫描完整结束时调用，运行次数随之加一
+        """
+        with self.lock:
+            data = {'run': self.run + 1, 'latest_id': self.latest_id, 'ids': {str(k): self.ids[k] for k in sorted(self.ids)}}
+            if self.listing:
+                data['listing'] = {str(k): self.listing[k] for k in sorted(self.listing)}
+        atomic_write(self.path, json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
@@ -0,0 +1,359 @@
+# -*- coding: UTF-8 -*-
+import functools
+import json
+import os
+
+import requests
+
+from account_pool import AccountPool
+from bilibili_auth import BilibiliAuth
+from catalogue import build_catalogue, load_packages
+from change_feed import ChangeFeed
+from checkpoint import Checkpoint
+from discovery import discover_latest_id
+from emoji_store import EmojiStore
+from emote_search import EmoteSearchIndex
+from http_cache import ResponseCache
+from id_planner import IdPlanner, IntervalSet
+from listing import PackageListing
+from metrics import METRICS, timed_get
+from output import EmojiWriter
+from pipeline import Pipeline
+from retry_policy import CircuitBreaker, RetryPolicy, RetryQueue, ThrottledError, TransientError, parse_retry_after
+from scan_state import ScanState
+from sharding import ShardSpec
+
+
+class BaseBiliEmoji:
+    """
+    表情包扫描器的公共部分：配置、认证、扫描状态、ID规划、解析、保存与收尾
+    子类实现具体的获取方式；批量接口的请求与最新ID探测由本类提供
+    """
+
+    def __init__(self, auth=None, shard: ShardSpec = None):
+        """
+        初始化配置和认证信息
+        :param auth: 认证模块，需提供 has_access(mid) 与 get_access(mid)；默认使用 BilibiliAuth 连接 ACCOUNT_DB_URI
+        :param shard: 分片，只扫描属于该分片的ID，结果写入 partial/<分片名>/，再由 merge_shards.py 合并到 list/
+        """
+        self.PROXY = json.loads(os.getenv('PROXY', '{}'))  # 代理配置
+        self.SCAN_CONFIG = json.loads(
+            os.getenv('SCAN_CONFIG', '{"start": 1, "end": 10000, "step": 40, "ignore": [4, 250]}'))  # 扫描配置
+
+        self.ACCOUNT = int(os.getenv('ACCOUNT', 1))  # 账号ID
+        self.AUTH = auth or BilibiliAuth()  # 认证模块
+
+        self.STATE = ScanState(os.getenv('SCAN_STATE', 'scan_state.json'))  # 扫描状态索引
+        self.SHARD = shard
+        self.WRITER = EmojiWriter(os.path.join(shard.out_dir, 'list') if shard else 'list')  # 输出层
+        if shard:  # 分片的扫描状态写入分片目录，合并时再与共享的状态合并
+            self.STATE.path = os.path.join(shard.out_dir, 'scan_state.json')
+        self.SEARCH_INDEX = None
+        if self.SCAN_CONFIG.get('search_index') and not shard:  # 表情检索索引，随表情包的新增与更新增量维护
+            self.SEARCH_INDEX = EmoteSearchIndex.load_or_build(os.getenv('SEARCH_INDEX', 'emote_search.pickle'))
+            self.WRITER.listeners.append(lambda emoji_info, *_: self.SEARCH_INDEX.update_package(emoji_info))
+        self.CHANGE_FEED = None
+        if self.SCAN_CONFIG.get('change_feed') and not shard:  # 变更记录，比较每个写入的表情包与原有内容
+            self.CHANGE_FEED = ChangeFeed(os.getenv('CHANGE_DIR', 'changes'))
+            self.WRITER.listeners.append(self.CHANGE_FEED.record)
+        self.STORE = None
+        if self.SCAN_CONFIG.get('sqlite_store') and not shard:  # SQLite 输出后端，随 list/ 一起按批写入
+            self.STORE = EmojiStore(os.getenv('EMOJI_DB', 'emoji.sqlite'))
+        self.API_BASE = os.getenv('API_BASE', 'https://api.bilibili.com')  # 接口地址，可指向本地测试服务
+        self.RETRY = RetryPolicy(**self.SCAN_CONFIG.get('retry', {}))  # 重试策略
+        self.BREAKER = CircuitBreaker(self.SCAN_CONFIG.get('cooldown', 5))  # 限流熔断器，所有工作线程共享
+        self.CHECKPOINT = Checkpoint(os.path.join(shard.out_dir, 'scan_checkpoint.log') if shard
+                                     else os.getenv('SCAN_CHECKPOINT', 'scan_checkpoint.log'),
+                                     state=self.STATE)  # 扫描断点，同时记录已完成ID的扫描状态
+        self.RETRY_QUEUE = RetryQueue(self.CHECKPOINT)  # 多次重试仍失败的ID
+        self.HTTP_CACHE = None
+        if os.getenv('HTTP_CACHE'):  # 响应缓存，重复运行时未变化的响应直接从本地读取
+            self.HTTP_CACHE = ResponseCache(os.getenv('HTTP_CACHE'), self.SCAN_CONFIG.get('cache_max_age', 3600),
+                                            self.SCAN_CONFIG.get('cache_max_mb', 256) * 1024 * 1024)
+        self.PIPELINE = None  # 扫描期间的 解析 → 写入 流水线
+
+    @functools.cached_property
+    def ACCOUNTS(self) -> AccountPool:
+        """
+        认证请求使用的账号池，在需要认证的请求首次使用时才加载，匿名扫描无需连接数据库
+        环境变量 ACCOUNTS 为逗号分隔的 mid 列表，或 all 表示数据库中的全部账号；未设置时只使用 ACCOUNT
+        """
+        mids = os.getenv('ACCOUNTS')
+        if mids == 'all':
+            mids = self.AUTH.list_accounts()
+        elif mids:
+            mids = [int(mid) for mid in mids.split(',')]
+        else:
+            mids = [self.ACCOUNT]
+        return AccountPool(self.AUTH, mids, self.SCAN_CONFIG.get('account_rps', 2))
+
+    def _can_authenticate(self) -> bool:
+        """
+        认证请求是否可用：设置了 ACCOUNTS，或 ACCOUNT 有缓存的凭据、配置了账号数据库
+        不可用时跳过 AllPackages，匿名扫描无需等待数据库连接超时
+        """
+        if os.getenv('ACCOUNTS') or self.AUTH.has_access(self.ACCOUNT):
+            return True
+        print("[INFO] 未设置 ACCOUNT_DB_URI 且没有缓存的凭据，跳过 AllPackages 列表")
+        return False
+
+    @functools.cached_property
+    def LISTING(self) -> PackageListing:
+        """
+        AllPackages 列表接口
+        """
+        return PackageListing(self.ACCOUNTS, self.API_BASE, self.PROXY, self.RETRY, cache=self.HTTP_CACHE)
+
+    @staticmethod
+    @METRICS.timed('parse_package_seconds')
+    def _parse_package(package: dict) -> dict:
+        """
+        解析单个表情包信息，兼容批量接口（emote）与 PackageDetail（emotes）的格式
+        :param package: 表情包数据
+        :return: 解析后的表情包字典
+        """
+        package_dict = {
+            'id': package['id'],
+            'text': package['text'],
+            'icon': package['url'].replace('http://', 'https://'),
+            'resource_type': package.get('resource_type', 0),
+        }
+        emotes = package.get('emote', package.get('emotes'))
+        if emotes is not None:
+            emote_list = []
+            for emote in emotes:
+                emote_data = {
+                    'text': emote['text'].replace('[', '').replace(']', ''),
+                    'url': emote['url'].replace('http://', 'https://'),
+                }
+                if 'gif_url' in emote:  # 动态表情
+                    emote_data['gif_url'] = emote['gif_url'].replace('http://', 'https://')
+                if 'webp_url' in emote:
+                    emote_data['webp_url'] = emote['webp_url'].replace('http://', 'https://')
+                emote_list.append(emote_data)
+            package_dict['emote'] = emote_list
+        return package_dict
+
+    @METRICS.timed('save_emoji_info_seconds')
+    def save_emoji_info(self, emoji_info: dict) -> str:
+        """
+        保存表情包信息到本地文件，内容未变化时不写入
+        :param emoji_info: 表情包信息字典
+        :return: 'added'、'changed' 或 'unchanged'
+        """
+        status = self.WRITER.save(emoji_info)
+        METRICS.inc('package_writes', status=status)
+        return status
+
+    def _write_packages(self, batch: list):
+        """
+        流水线写入阶段：记录扫描状态、保存，启用 SQLite 存储时整批在一个事务中写入数据库，最后标记断点
+        :param batch: [(表情包ID, 解析后的表情包字典)] 列表
+        """
+        saved = []
+        for id_, emoji_info in batch:
+            try:
+                self.STATE.record(id_, emoji_info)
+                self.save_emoji_info(emoji_info)
+            except Exception as e:
+                print(f"[ERROR] 表情包ID {id_} 保存失败: {e}")
+                self.RETRY_QUEUE.add(id_)
+                continue
+            saved.append((id_, emoji_info))
+        if self.STORE and saved:
+            try:
+                self.STORE.upsert([emoji_info for _, emoji_info in saved])
+            except Exception as e:
+                print(f"[ERROR] {len(saved)} 个表情包写入数据库失败: {e}")
+                for id_, _ in saved:
+                    self.RETRY_QUEUE.add(id_)
+                return
+        for id_, _ in saved:
+            self.CHECKPOINT.mark_done(id_)
+
+    def _run_stage(self, fetch, ids: list):
+        """
+        运行获取阶段，获取到的原始数据经 解析 → 写入 流水线处理，返回前等待全部写入完成
+        队列容量与解析线程数分别由 SCAN_CONFIG['queue_size'] 与 SCAN_CONFIG['parse_workers'] 控制
+        :param fetch: 获取函数，参数为ID列表，通过 self.PIPELINE.put() 提交原始数据
+        :param ids: 表情包ID列表
+        """
+        self.PIPELINE = Pipeline(
+            self._parse_package,
+            self._write_packages,
+            queue_size=self.SCAN_CONFIG.get('queue_size', 1000),
+            parse_workers=self.SCAN_CONFIG.get('parse_workers', 1),
+            on_parse_error=self.RETRY_QUEUE.add,  # 解析失败的ID与保存失败的一样在运行结束前重试
+        )
+        try:
+            fetch(ids)
+        finally:
+            self.PIPELINE.close()
+            self.PIPELINE = None
+
+    def _scan(self, fetch):
+        """
+        扫描主流程：生成ID列表并运行获取阶段，运行结束前统一重试失败的ID，最后收尾
+        :param fetch: 获取函数，参见 _run_stage
+        """
+        ids = self.get_scan_ids()
+        self._run_stage(fetch, ids)
+        failed = self.RETRY_QUEUE.drain()
+        if failed:  # 运行结束前统一重试失败的ID
+            print(f"[INFO] 重试 {len(failed)} 个失败的表情包ID")
+            self._run_stage(fetch, failed)
+            self._report_failed()
+        self.finish_scan()
+
+    def _request_batch(self, ids: list) -> tuple:
+        """
+        请求批量接口获取表情包信息
+        限流时抛出 ThrottledError，网络错误与服务端临时错误抛出 TransientError，其他失败（如批次本身无效）抛出 Exception
+        :param ids: 表情包ID列表
+        :return: (接口返回的表情包列表, 响应体字节数)
+        """
+        params = {
+            'business': 'reply',
+            'ids': ','.join([str(i) for i in ids]),
+            'mobi_app': 'android_i'
+        }
+        headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36 Edg/121.0.0.0',
+            'Referer': 'https://www.bilibili.com/',
+            'Origin': 'https://www.bilibili.com',
+            'Accept': '*/*',
+            'Accept-Encoding': 'gzip, deflate, br',
+            'Accept-Language': 'zh-CN,zh;q=0.9'
+        }
+        # 发送请求获取表情包信息
+        try:
+            response, response_json = timed_get(requests.get, 'package', f'{self.API_BASE}/x/emote/package',
+                                                params=params, headers=headers, proxies=self.PROXY, timeout=10)
+        except requests.RequestException as e:
+            raise TransientError(str(e))
+        code = response_json.get('code') if isinstance(response_json, dict) else None
+        kind = self.RETRY.classify(response.status_code, code)  # 检查返回结果是否正常
+        if kind in ('throttle', 'transient'):
+            error = ThrottledError if kind == 'throttle' else TransientError
+            raise error(f"HTTP {response.status_code}, code {code}",
+                        parse_retry_after(response.headers.get('Retry-After')))
+        if kind != 'ok':
+            message = response_json.get('message') if isinstance(response_json, dict) else None
+            raise Exception(message or f"HTTP {response.status_code}")
+        self.BREAKER.record_success()
+        return response_json['data']['packages'] or [], len(response.content)
+
+    def _probe_ids(self, ids: list) -> list:
+        """
+        通过批量接口探测给定ID中哪些存在表情包，不使用响应缓存
+        :param ids: 表情包ID列表
+        :return: 存在表情包的ID列表
+        """
+        return [package['id'] for package in self._request_batch(ids)[0]]
+
+    @METRICS.timed('get_latest_emoji_id_seconds')
+    def get_latest_emoji_id(self) -> int:
+        """
+        获取最新的表情包ID
+        以 SCAN_CONFIG['end']、上次运行缓存的结果、list/ 中最大的ID 与 AllPackages 列表中的最大ID 为起点，
+        再通过批量接口倍增 + 二分探测更大的ID，结果不会低于以上任何一项
+        :return: 最新表情包ID
+        """
+        seed = max(self.SCAN_CONFIG['end'], self.STATE.latest_id, self.STATE.max_package_id(),
+                   max(self.WRITER.index, default=0), self._get_listing_latest_id())
+        latest = discover_latest_id(self._probe_ids, seed)
+        print(f"[INFO] 最新表情包ID: {latest}（起点 {seed}）")
+        self.STATE.latest_id = latest
+        return latest
+
+    def _get_listing_latest_id(self) -> int:
+        """
+        通过 AllPackages 列表接口获取最大的表情包ID（读取第一页与最后一页）
+        :return: 最大表情包ID；失败或无法认证时返回 0
+        """
+        if not self._can_authenticate():
+            return 0
+        try:
+            first = self.LISTING.fetch_page(1)
+            last = self.LISTING.fetch_page(first.get('total', 0) // self.LISTING.page_size + 1)
+            packages = (first.get('packages') or []) + (last.get('packages') or [])
+            return max((pkg['id'] for pkg in packages), default=0)
+        except Exception as e:
+            print(f"[ERROR] 获取最新表情包ID异常: {e}")
+            return 0
+
+    def _get_listing_ids(self):
+        """
+        列表驱动扫描：并发获取 AllPackages 的全部页，只选出列表中新出现或有变化的表情包获取详情
+        :return: 表情包ID列表；列表获取失败或无法认证时返回 None，改为按ID扫描
+        """
+        if not self._can_authenticate():
+            return None
+        try:
+            packages = self.LISTING.fetch_all(self.SCAN_CONFIG.get('listing_concurrency', 8))
+        except Exception as e:
+            print(f"[ERROR] 获取表情包列表失败，改为按ID扫描: {e}")
+            return None
+        ignore = IntervalSet.from_config(self.SCAN_CONFIG['ignore'])
+        ids = [id_ for id_ in self.STATE.select_listing(packages) if id_ not in ignore]
+        if packages:
+            self.STATE.latest_id = max(self.STATE.latest_id, packages[-1]['id'])
+        print(f"[INFO] 列表中共 {len(packages)} 个表情包，其中 {len(ids)} 个新增或有变化")
+        return ids
+
+    def get_scan_ids(self):
+        """
+        生成本次需要扫描的表情包ID列表
+        :return: 表情包ID列表
+        """
+        ids = self._get_listing_ids() if self.SCAN_CONFIG.get('listing') else None
+        if ids is None:
+            end_id = self.get_latest_emoji_id()
+            planner = IdPlanner(self.SCAN_CONFIG['ignore'], self.STATE)  # 跳过忽略的ID与确认为空的区间
+            ids = planner.plan(self.SCAN_CONFIG['start'], end_id + 50)
+            if self.SCAN_CONFIG.get('incremental'):  # 增量扫描，只获取新的、近期变化的与轮转到的ID
+                ids = self.STATE.select(ids, self.SCAN_CONFIG.get('rotation', 8), self.SCAN_CONFIG.get('recent_days', 3))
+        if self.SHARD:
+            ids = self.SHARD.filter(ids)
+        if self.SCAN_CONFIG.get('resume'):  # 从断点继续，跳过已完成的ID并优先重试上次失败的ID
+            done, failed = self.CHECKPOINT.load()
+            ids = sorted(failed) + [id_ for id_ in ids if id_ not in done and id_ not in failed]
+            print(f"[INFO] 从断点继续: 跳过 {len(done)} 个已完成的ID，优先重试 {len(failed)} 个失败的ID")
+        else:
+            self.CHECKPOINT.reset()
+        return ids
+
+    def _report_failed(self):
+        """
+        输出重试后仍失败的ID
+        """
+        failed = self.RETRY_QUEUE.drain()
+        if failed:
+            METRICS.inc('failed_ids', len(failed))
+            print(f"[ERROR] {len(failed)} 个表情包ID重试后仍失败: {failed}")
+
+    def finish_scan(self):
+        """
+        扫描结束后的收尾：保存扫描状态，按配置生成目录、保存检索索引、镜像图片，并输出运行指标
+        """
+        self.STATE.save()
+        self.CHECKPOINT.clear()  # 扫描已完整结束，不再需要断点
+        print(f"[INFO] 扫描完成: {self.WRITER.summary()}")
+        if self.CHANGE_FEED:
+            print(f"[INFO] 变更记录: {self.CHANGE_FEED.flush()['message']}")
+        if self.SHARD:  # 目录、检索索引与图片镜像在分片合并后生成
+            print(f"[INFO] 分片结果已写入 {self.SHARD.out_dir}，请使用 merge_shards.py 合并")
+        elif self.SCAN_CONFIG.get('catalogue'):  # 生成合并的表情包目录
+            build_catalogue(load_packages('list'))
+        if self.HTTP_CACHE:
+            self.HTTP_CACHE.close()
+        if self.STORE:
+            self.STORE.close()
+        if self.SEARCH_INDEX:
+            self.SEARCH_INDEX.save(os.getenv('SEARCH_INDEX', 'emote_search.pickle'))
+        if self.SCAN_CONFIG.get('mirror_assets') and not self.SHARD:  # 镜像表情图片，仅下载尚未存储的图片
+            from asset_mirror import AssetMirror, collect_asset_urls
+            asset_mirror = AssetMirror(os.getenv('ASSET_DIR', 'assets'), retry=self.RETRY)
+            asset_mirror.mirror(collect_asset_urls(load_packages('list')))
+            print(f"[INFO] 图片镜像完成: {asset_mirror.summary()}")
+        METRICS.emit(os.getenv('METRICS_FILE'), os.getenv('METRICS_PROM_FILE'))
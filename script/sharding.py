@@ -0,0 +1,77 @@
+# -*- coding: UTF-8 -*-
+import os
+
+from id_planner import IntervalSet
+
+PARTIAL_DIR = 'partial'  # 分片扫描结果的根目录
+
+
+class ShardSpec:
+    """
+    分片扫描：按 id % count == index - 1 取模分片，或限定ID区间，二者可同时使用
+    分片的结果写入 partial/<name>/，由 merge_shards.py 合并到 list/
+    """
+
+    def __init__(self, index=1, count=1, id_range=None):
+        """
+        :param index: 分片序号，从 1 开始
+        :param count: 分片总数
+        :param id_range: ID区间 (起始, 结束)，闭区间；None 表示不限制
+        """
+        if not 1 <= index <= count:
+            raise ValueError(f"分片序号 {index} 超出范围 1-{count}")
+        self.index = index
+        self.count = count
+        self.id_range = id_range
+
+    @classmethod
+    def parse(cls, shard=None, id_range=None):
+        """
+        解析命令行中的分片参数
+        :param shard: "k/n"，例如 "3/8"
+        :param id_range: "起始-结束"，例如 "1-5000"
+        :return: ShardSpec 实例；两个参数都未指定时返回 None
+        """
+        if not shard and not id_range:
+            return None
+        index, count = 1, 1
+        if shard:
+            k, sep, n = shard.partition('/')
+            if not (sep and k.isdigit() and n.isdigit()):
+                raise ValueError(f"无效的分片参数: {shard}，应为 k/n")
+            index, count = int(k), int(n)
+        if id_range:
+            interval = IntervalSet.from_config([id_range])
+            id_range = (interval.starts[0], interval.ends[0])
+        return cls(index, count, id_range)
+
+    @property
+    def name(self) -> str:
+        """
+        :return: 分片名，例如 shard-3-of-8、range-1-5000 或 shard-3-of-8-range-1-5000
+        """
+        parts = []
+        if self.count > 1:
+            parts.append(f'shard-{self.index}-of-{self.count}')
+        if self.id_range:
+            parts.append(f'range-{self.id_range[0]}-{self.id_range[1]}')
+        return '-'.join(parts) or 'shard-1-of-1'
+
+    @property
+    def out_dir(self) -> str:
+        """
+        :return: 分片的结果目录，其中 list/ 为表情包文件，scan_state.json 为扫描状态
+        """
+        return os.path.join(PARTIAL_DIR, self.name)
+
+    def __contains__(self, id_) -> bool:
+        if self.id_range and not self.id_range[0] <= id_ <= self.id_range[1]:
+            return False
+        return id_ % self.count == self.index - 1
+
+    def filter(self, ids) -> list:
+        """
+        :param ids: 表情包ID列表
+        :return: 属于本分片的ID，保持原有顺序
+        """
+        return [id_ for id_ in ids if id_ in self]
@@ -0,0 +1,68 @@
+# -*- coding: UTF-8 -*-
+import hashlib
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'script'), os.path.join(ROOT, 'bench')]
+
+from fake_api import FakeBiliApi  # noqa: E402
+from run_bench import FakeAuth  # noqa: E402
+
+# 会改变扫描行为的环境变量，测试中统一清除
+SCAN_ENV = ('HTTP_CACHE', 'ACCOUNTS', 'SCAN_CHECKPOINT', 'SEARCH_INDEX', 'EMOJI_DB', 'CHANGE_DIR', 'METRICS_FILE',
+            'METRICS_PROM_FILE', 'PROXY')
+
+
+def make_package(id_: int) -> dict:
+    """
+    :return: 与 list/ 中格式一致的表情包，图片地址使用 bfs 内容哈希格式
+    """
+    def url(name):
+        return f"https://i0.hdslb.com/bfs/emote/{hashlib.sha1(name.encode()).hexdigest()}.png"
+
+    return {
+        'id': id_,
+        'text': f'表情包{id_}',
+        'icon': url(f'icon{id_}'),
+        'resource_type': 0,
+        'emote': [{'text': f'表情{id_}_{n}', 'url': url(f'{id_}_{n}')} for n in range(3)],
+    }
+
+
+def write_packages(list_dir, packages):
+    os.makedirs(list_dir, exist_ok=True)
+    for package in packages:
+        with open(os.path.join(list_dir, f"{package['id']}-{package['text']}.json"), 'w', encoding='utf-8') as f:
+            json.dump(package, f, ensure_ascii=False, indent=2)
+
+
+@pytest.fixture
+def scanner(tmp_path, monkeypatch):
+    """
+    在临时目录中启动模拟接口并创建扫描器
+    调用方式：emoji, api = scanner(module, count, scan_config, **FakeBiliApi 参数)
+    """
+    apis = []
+    work_dir = tmp_path / 'work'
+    work_dir.mkdir()
+    monkeypatch.chdir(work_dir)
+    for name in SCAN_ENV:
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv('CREDENTIAL_CACHE', '')
+
+    def create(module, count, scan_config, **api_kwargs):
+        write_packages(tmp_path / 'source', [make_package(id_) for id_ in range(1, count + 1)])
+        api = FakeBiliApi(str(tmp_path / 'source'), **api_kwargs)
+        apis.append(api)
+        monkeypatch.setenv('API_BASE', api.start())
+        config = {'start': 1, 'end': count, 'step': 40, 'ignore': [], 'account_rps': 0}
+        monkeypatch.setenv('SCAN_CONFIG', json.dumps(dict(config, **scan_config)))
+        return module.BiliEmoji(auth=FakeAuth()), api
+
+    yield create
+    for api in apis:
+        api.stop()
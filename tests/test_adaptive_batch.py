@@ -0,0 +1,47 @@
+# -*- coding: UTF-8 -*-
+from adaptive_batch import AdaptiveBatchSizer
+
+
+def test_initial_size_is_clamped():
+    assert AdaptiveBatchSizer(initial=100, minimum=5, maximum=40).next_size() == 40
+    assert AdaptiveBatchSizer(initial=1, minimum=5, maximum=40).next_size() == 5
+    assert AdaptiveBatchSizer(initial=10, minimum=0, maximum=0).next_size() == 1
+
+
+def test_errors_halve_down_to_minimum():
+    sizer = AdaptiveBatchSizer(initial=40, minimum=5, maximum=40)
+    sizes = []
+    for _ in range(4):
+        sizer.observe(sizer.next_size(), 0.1, False)
+        sizes.append(sizer.next_size())
+    assert sizes == [20, 10, 5, 5]
+
+
+def test_failed_small_batch_halves_from_its_own_size():
+    sizer = AdaptiveBatchSizer(initial=40, minimum=5, maximum=40)
+    sizer.observe(12, 0.1, False)  # 拆分后的小批次失败
+    assert sizer.next_size() == 6
+
+
+def test_slow_or_large_responses_shrink():
+    sizer = AdaptiveBatchSizer(initial=40, minimum=5, maximum=40, target_latency=2.0, max_bytes=1000)
+    sizer.observe(40, 3.0, True)
+    assert sizer.next_size() == 30
+    sizer.observe(30, 0.1, True, nbytes=2000)
+    assert sizer.next_size() == 22
+
+
+def test_grows_only_on_full_batches_after_errors_decay():
+    sizer = AdaptiveBatchSizer(initial=40, minimum=5, maximum=40)
+    sizer.observe(40, 0.1, False)
+    assert sizer.next_size() == 20
+    sizer.observe(20, 0.1, True)  # 刚出错，错误率仍高
+    assert sizer.next_size() == 20
+    for _ in range(10):
+        sizer.observe(10, 0.1, True)  # 不满批不增大
+    assert sizer.next_size() == 20
+    sizer.observe(20, 0.1, True)
+    assert sizer.next_size() == 25
+    for _ in range(5):
+        sizer.observe(sizer.next_size(), 0.1, True)
+    assert sizer.next_size() == 40
@@ -0,0 +1,158 @@
+# -*- coding: UTF-8 -*-
+import hashlib
+import os
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from asset_mirror import AssetMirror, asset_key, collect_asset_urls
+from retry_policy import RetryPolicy
+
+FAST_RETRY = RetryPolicy(attempts=3, base=0.01, cap=0.02)
+
+
+class ImageServer:
+    """
+    本地图片服务，按路径返回固定内容，支持 Range 请求，并记录收到的请求
+    corrupt 次数内的请求返回内容有误的图片
+    """
+
+    def __init__(self, ranges=True, corrupt=0):
+        self.images = {}  # 路径 -> 内容
+        self.requests = []  # (路径, Range 请求头)
+        self.ranges = ranges
+        self.corrupt = corrupt
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests.append((self.path, self.headers.get('Range')))
+                data = server.images.get(self.path)
+                if data is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                if server.corrupt:
+                    server.corrupt -= 1
+                    data = data[:-1] + bytes([data[-1] ^ 0xff])
+                status, offset = 200, 0
+                if server.ranges and self.headers.get('Range'):
+                    offset = int(self.headers['Range'].split('=')[1].rstrip('-'))
+                    status = 206
+                    if offset >= len(data):
+                        self.send_response(416)
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                self.send_response(status)
+                self.send_header('Content-Length', str(len(data) - offset))
+                self.end_headers()
+                self.wfile.write(data[offset:])
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def add(self, data: bytes) -> str:
+        """
+        :return: 图片地址，格式与B站一致（/bfs/emote/<sha1>.png）
+        """
+        path = f'/bfs/emote/{hashlib.sha1(data).hexdigest()}.png'
+        self.images[path] = data
+        return f'http://127.0.0.1:{self.httpd.server_address[1]}{path}'
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def image_server():
+    server = ImageServer()
+    yield server
+    server.close()
+
+
+def test_mirror_downloads_each_image_once(image_server, tmp_path):
+    icon, smile, gif = (image_server.add(data) for data in (b'icon', b'smile' * 1000, b'gif' * 5000))
+    packages = [
+        {'id': 1, 'text': 'a', 'icon': icon, 'emote': [{'text': 'x', 'url': smile, 'gif_url': gif}]},
+        {'id': 2, 'text': 'b', 'icon': icon, 'emote': [{'text': 'y', 'url': smile}]},  # 与表情包 1 共用图片
+    ]
+    assets = collect_asset_urls(packages)
+    assert len(assets) == 3
+
+    mirror = AssetMirror(str(tmp_path / 'assets'), workers=4)
+    mirror.mirror(assets)
+    assert mirror.counts == {'downloaded': 3, 'skipped': 0, 'failed': 0}
+    for key, url in assets.items():
+        with open(mirror.path(key), 'rb') as f:
+            assert f.read() == image_server.images[urllib.parse.urlsplit(url).path]
+
+    again = AssetMirror(str(tmp_path / 'assets'), workers=4)
+    again.mirror(assets)
+    assert again.counts == {'downloaded': 0, 'skipped': 3, 'failed': 0}
+    assert len(image_server.requests) == 3  # 已存储的图片不再请求
+
+
+@pytest.mark.parametrize('ranges', [True, False])
+def test_mirror_resumes_partial_download(tmp_path, ranges):
+    server = ImageServer(ranges)
+    try:
+        data = os.urandom(200 * 1024)
+        url = server.add(data)
+        mirror = AssetMirror(str(tmp_path / 'assets'))
+        key = asset_key(url)
+        os.makedirs(os.path.dirname(mirror.path(key)))
+        with open(f'{mirror.path(key)}.part', 'wb') as f:  # 上次运行中断时留下的前半部分
+            f.write(data[:100 * 1024])
+
+        assert mirror.download(key, url)
+        with open(mirror.path(key), 'rb') as f:
+            assert f.read() == data  # 不支持 Range 的服务端返回 200 时从头下载
+        assert server.requests == [(urllib.parse.urlsplit(url).path, 'bytes=102400-')]
+        assert not os.path.exists(f'{mirror.path(key)}.part')
+    finally:
+        server.close()
+
+
+def test_oversized_part_is_not_accepted_on_416(tmp_path):
+    server = ImageServer()
+    try:
+        data = os.urandom(64 * 1024)
+        url = server.add(data)
+        mirror = AssetMirror(str(tmp_path / 'assets'), retry=FAST_RETRY)
+        key = asset_key(url)
+        os.makedirs(os.path.dirname(mirror.path(key)))
+        with open(f'{mirror.path(key)}.part', 'wb') as f:  # 比图片更长的损坏文件，续传请求得到 416
+            f.write(os.urandom(100 * 1024))
+
+        assert mirror.download(key, url)
+        with open(mirror.path(key), 'rb') as f:
+            assert f.read() == data
+        assert [range_ for _, range_ in server.requests] == ['bytes=102400-', None]
+    finally:
+        server.close()
+
+
+def test_corrupt_download_is_retried_not_stored(tmp_path):
+    server = ImageServer(corrupt=3)
+    try:
+        data = os.urandom(64 * 1024)
+        url = server.add(data)
+        mirror = AssetMirror(str(tmp_path / 'assets'), retry=FAST_RETRY)
+        key = asset_key(url)
+        assert not mirror.download(key, url)  # 3 次都内容有误
+        assert not os.path.exists(mirror.path(key)) and not os.path.exists(f'{mirror.path(key)}.part')
+
+        assert mirror.download(key, url)
+        with open(mirror.path(key), 'rb') as f:
+            assert f.read() == data
+        assert mirror.counts == {'downloaded': 1, 'skipped': 0, 'failed': 1}
+    finally:
+        server.close()
@@ -0,0 +1,73 @@
+# -*- coding: UTF-8 -*-
+import json
+import os
+import time
+
+import pytest
+
+pytest.importorskip('aiohttp')
+
+import main_new  # noqa: E402
+from conftest import make_package  # noqa: E402
+
+DETAIL = 'EmoteService/PackageDetail'
+
+
+def detail_records(api) -> list:
+    return [record for record in api.records if record[0].endswith(DETAIL)]
+
+
+def max_per_second(arrivals: list) -> int:
+    """
+    :return: 任意 1 秒窗口内到达的最多请求数
+    """
+    arrivals = sorted(arrivals)
+    best, j = 0, 0
+    for i, t in enumerate(arrivals):
+        while arrivals[j] <= t - 1.0:
+            j += 1
+        best = max(best, i - j + 1)
+    return best
+
+
+def test_async_scan_writes_every_package(scanner):
+    emoji, api = scanner(main_new, 30, {'concurrency': 10})
+    emoji.main_async()
+
+    assert emoji.WRITER.counts == {'added': 30, 'changed': 0, 'unchanged': 0}
+    with open(os.path.join('list', '7-表情包7.json'), encoding='utf-8') as f:
+        assert json.load(f) == make_package(7)
+
+
+def test_async_rate_cap_holds_when_latency_drops(scanner):
+    """
+    延迟下降时，排队期间积压的请求不能集中发出：任意 1 秒内的请求数不超过 rps 加桶容量
+    """
+    rps = 20
+    emoji, api = scanner(main_new, 40, {'concurrency': 10, 'rps': rps})
+    handle, started = api.handle, []
+
+    def slow_then_fast(path, query):  # 前 3 秒每个请求耗时 1 秒，并发 10 时只能达到 10 rps，之后恢复正常
+        if path.endswith(DETAIL):
+            started.append(time.monotonic())
+            api.latency = 1.0 if started[-1] - started[0] < 3 else 0.005
+        return handle(path, query)
+
+    api.handle = slow_then_fast
+    emoji.main_async()
+
+    assert emoji.WRITER.counts['added'] == 40
+    assert max_per_second([record[4] for record in detail_records(api)]) <= 2 * rps + 5  # 令牌桶最多允许 rps + 桶容量，留出少量调度误差
+
+
+def test_async_throttle_pauses_queued_requests(scanner):
+    """
+    服务端限流时，熔断期间排队中的协程不能继续发送，所有表情包最终都应获取成功
+    """
+    emoji, api = scanner(main_new, 60, {'concurrency': 10, 'cooldown': 1.0,
+                                        'retry': {'attempts': 3, 'base': 0.05, 'cap': 0.5}}, throttle_rps=20)
+    emoji.main_async()
+
+    statuses = [record[1] for record in detail_records(api)]
+    assert emoji.WRITER.counts['added'] == 60
+    assert statuses.count(412) < statuses.count(200)
@@ -0,0 +1,58 @@
+# -*- coding: UTF-8 -*-
+import os
+
+import pytest
+
+import main
+import main_new
+from retry_policy import ThrottledError, TransientError
+
+BATCH = '/x/emote/package'
+RETRY = {'retry': {'attempts': 3, 'base': 0.05, 'cap': 0.2}}
+
+
+def batch_requests(api) -> list:
+    return [record for record in api.records if record[0] == BATCH]
+
+
+def test_server_errors_are_backed_off_not_split(scanner):
+    emoji, api = scanner(main, 120, dict(RETRY, step=40, min_step=40, max_step=40))
+    emoji.get_scan_ids = lambda: list(range(1, 121))
+    api.error_rate = 1.0
+    emoji.main()
+
+    requests = batch_requests(api)
+    assert len(requests) == 3 * 3 * 2  # 3 批，每批尝试 3 次，结束前统一重试一次，不拆分
+    arrivals = sorted(record[4] for record in requests)
+    assert arrivals[-1] - arrivals[0] > 0.05  # 重试之间有退避
+    assert not os.path.exists('list') or not os.listdir('list')
+
+
+def test_transient_error_then_success(scanner):
+    emoji, api = scanner(main, 80, dict(RETRY, step=40, min_step=40, max_step=40))
+    emoji.get_scan_ids = lambda: list(range(1, 81))
+    handle, failures = api.handle, [2]
+
+    def flaky(path, query):
+        if path == BATCH and failures[0]:
+            failures[0] -= 1
+            return 503, {'code': -503, 'message': '服务暂不可用'}
+        return handle(path, query)
+
+    api.handle = flaky
+    emoji.main()
+    assert len(batch_requests(api)) == 2 + 2  # 两次失败都重试同一批
+    assert len(os.listdir('list')) == 80
+
+
+@pytest.mark.parametrize('status, body, error', [
+    (200, '维护中', TransientError),  # 响应不是 JSON 对象
+    (412, {'code': -412, 'message': '请求被拦截'}, ThrottledError),
+    (503, {'code': -503, 'message': '服务暂不可用'}, TransientError),
+])
+def test_probe_uses_the_shared_batch_request(scanner, status, body, error):
+    emoji, api = scanner(main_new, 10, {})
+    assert emoji._probe_ids([1, 5, 11]) == [1, 5]
+    api.handle = lambda path, query: (status, body)
+    with pytest.raises(error):
+        emoji._probe_ids([1, 5, 11])
@@ -0,0 +1,20 @@
+# -*- coding: UTF-8 -*-
+import json
+import urllib.request
+
+from conftest import make_package, write_packages
+from run_bench import ApiProcess
+
+
+def test_api_process_starts_on_list_with_duplicate_ids(tmp_path):
+    list_dir = tmp_path / 'list'
+    write_packages(list_dir, [make_package(1), make_package(2), dict(make_package(2), text='旧名称')])
+    api = ApiProcess(str(list_dir))
+    try:
+        assert api.max_id == 1  # 存在多个文件的ID 2 不回放
+        with urllib.request.urlopen(f'{api.url}/x/emote/package?ids=1,2') as response:
+            assert [package['id'] for package in json.load(response)['data']['packages']] == [1]
+        assert [record[0] for record in api.records] == ['/x/emote/package']
+    finally:
+        api.stop()
+    assert api.process.returncode == 0
@@ -0,0 +1,98 @@
+# -*- coding: UTF-8 -*-
+import os
+import stat
+import time
+from datetime import datetime, timedelta
+
+import main_new
+from bilibili_auth import BilibiliAuth
+
+
+class FakeCollection:
+    """
+    内存中的集合，只实现 bilibili_auth 用到的查询，并记录查询次数
+    """
+
+    def __init__(self, documents=()):
+        self.documents = list(documents)
+        self.queries = 0
+
+    def find_one(self, query):
+        self.queries += 1
+        return next((doc for doc in self.documents if all(doc.get(k) == v for k, v in query.items())), None)
+
+    def find(self, query, projection=None):
+        self.queries += 1
+        return [doc for doc in self.documents if all(doc.get(k) == v for k, v in query.items())]
+
+
+class FakeMongoClient(dict):
+    """
+    client['bilibili']['accounts'] 形式访问的内存数据库
+    """
+
+    def __init__(self, accounts):
+        super().__init__(bilibili={'accounts': FakeCollection(accounts)})
+
+    @property
+    def accounts(self) -> FakeCollection:
+        return self['bilibili']['accounts']
+
+
+def account(mid, days_ago=1, expires_in=None):
+    token_info = {'access_token': f'key{mid}', 'refresh_token': f'refresh{mid}'}
+    if expires_in:
+        token_info['expires_in'] = expires_in
+    return {
+        'mid': mid,
+        'token_info': token_info,
+        'cookie_info': {'cookies': [{'name': 'SESSDATA', 'value': f's{mid}'}, {'name': 'bili_jct', 'value': 'j'}]},
+        'last_update': datetime.now() - timedelta(days=days_ago),
+    }
+
+
+def test_get_access_is_served_from_local_cache(tmp_path):
+    client = FakeMongoClient([account(1), account(2)])
+    cache_path = str(tmp_path / 'credentials.json')
+
+    assert BilibiliAuth(client=client, cache_path=cache_path).get_access(1) == ('key1', 'SESSDATA=s1;bili_jct=j')
+    assert client.accounts.queries == 1
+    assert stat.S_IMODE(os.stat(cache_path).st_mode) == 0o600
+
+    again = BilibiliAuth(client=client, cache_path=cache_path)  # 下次运行
+    assert again.get_access(1) == ('key1', 'SESSDATA=s1;bili_jct=j')
+    assert client.accounts.queries == 1
+    again.get_access(2)
+    assert client.accounts.queries == 2
+
+
+def test_cache_expires_with_token(tmp_path):
+    client = FakeMongoClient([account(1, days_ago=0, expires_in=1)])
+    auth = BilibiliAuth(client=client, cache_path=str(tmp_path / 'credentials.json'))
+    auth.get_access(1)
+    time.sleep(1.1)
+    auth.get_access(1)
+    assert client.accounts.queries == 2  # token 已过期，重新查询
+
+
+def test_has_access_without_database(tmp_path, monkeypatch):
+    monkeypatch.delenv('ACCOUNT_DB_URI', raising=False)
+    cache_path = str(tmp_path / 'credentials.json')
+    assert not BilibiliAuth(cache_path=cache_path).has_access(1)
+    assert BilibiliAuth(db_uri='mongodb://db.example:27017/', cache_path=cache_path).has_access(1)
+
+    BilibiliAuth(client=FakeMongoClient([account(1)]), cache_path=cache_path).get_access(1)
+    assert BilibiliAuth(cache_path=cache_path).has_access(1)  # 只有缓存的凭据
+    assert not BilibiliAuth(cache_path=cache_path).has_access(2)
+
+
+def test_anonymous_scan_never_connects(scanner, monkeypatch):
+    emoji, api = scanner(main_new, 20, {})
+    monkeypatch.delenv('ACCOUNT_DB_URI', raising=False)
+    emoji.AUTH = BilibiliAuth()
+
+    start = time.monotonic()
+    assert emoji.get_latest_emoji_id() == 20
+    assert time.monotonic() - start < 5
+    assert emoji.AUTH._client is None
+    assert not [record for record in api.records if record[0].endswith('AllPackages')]
@@ -0,0 +1,32 @@
+# -*- coding: UTF-8 -*-
+import json
+
+from change_feed import ChangeFeed
+from conftest import make_package, write_packages
+from output import EmojiWriter
+
+
+def feed_events(feed_dir) -> list:
+    with open(feed_dir / 'feed.ndjson', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_stale_file_removal_is_recorded(tmp_path):
+    list_dir = tmp_path / 'list'
+    current, renamed = make_package(1), make_package(2)
+    write_packages(list_dir, [current, dict(current, text='旧名称'), dict(renamed, text='旧名称')])
+    feed = ChangeFeed(str(tmp_path / 'changes'))
+    writer = EmojiWriter(str(list_dir))
+    writer.listeners.append(feed.record)
+
+    assert writer.save(current) == 'changed'  # 当前名称的文件已存在且内容未变化，只删除旧文件
+    assert writer.save(renamed) == 'changed'
+    summary = feed.flush()
+
+    assert [(event['id'], event['type'], event.get('file')) for event in feed_events(tmp_path / 'changes')] == [
+        (1, 'stale_file_removed', '1-旧名称.json'),
+        (2, 'package_renamed', None),
+        (2, 'stale_file_removed', '2-旧名称.json'),
+    ]
+    assert summary['counts']['stale_file_removed'] == 2
+    assert summary['message'] == '1 renamed, 2 stale files removed'
@@ -0,0 +1,48 @@
+# -*- coding: UTF-8 -*-
+import os
+
+import main_new
+from checkpoint import Checkpoint
+from scan_state import ScanState
+
+
+def test_done_ids_carry_their_scan_state(tmp_path):
+    state = ScanState(str(tmp_path / 'scan_state.json'))
+    checkpoint = Checkpoint(str(tmp_path / 'scan_checkpoint.log'), flush_every=2, state=state)
+    for id_ in (1, 2, 3):
+        state.record(id_, {'id': id_, 'text': f'表情包{id_}'})
+        checkpoint.mark_done(id_)
+    state.record_empty(4)
+    checkpoint.mark_done(4)
+    checkpoint.mark_failed(5)
+    checkpoint.flush()
+    assert not os.path.exists(state.path)  # 断点只追加记录，不重写状态文件
+    with open(checkpoint.path, 'a', encoding='utf-8') as f:
+        f.write('d 6 [["abc",')  # 中断时写了半行
+
+    restored = ScanState(state.path)
+    done, failed = Checkpoint(checkpoint.path, state=restored).load()
+    assert done == {1, 2, 3, 4} and failed == {5}
+    assert restored.ids == state.ids
+
+
+def test_resume_keeps_run_counter_and_rotation_slice(scanner):
+    emoji, _ = scanner(main_new, 40, {})
+    emoji.main()
+    assert ScanState('scan_state.json').run == 1
+
+    config = {'incremental': True, 'rotation': 4, 'recent_days': 0}
+    emoji, api = scanner(main_new, 40, config)
+    planned = emoji.get_scan_ids()
+    finished = [id_ for id_ in planned if id_ in api.packages][:3]
+    assert all(id_ % 4 == 1 for id_ in finished)  # 第 2 次运行轮转到分片 1
+    for id_ in finished:  # 中断前完成了一部分
+        emoji.STATE.record(id_, emoji._parse_package(api.packages[id_]))
+        emoji.CHECKPOINT.mark_done(id_)
+    emoji.CHECKPOINT.flush()
+    recorded = {id_: emoji.STATE.ids[id_] for id_ in finished}
+    assert ScanState('scan_state.json').run == 1  # 中断的运行不计入运行次数
+
+    emoji, _ = scanner(main_new, 40, dict(config, resume=True))
+    assert emoji.get_scan_ids() == [id_ for id_ in planned if id_ not in finished]  # 续扫仍是同一个轮转分片
+    assert {id_: emoji.STATE.ids[id_] for id_ in finished} == recorded  # 已完成ID的状态由断点恢复
@@ -0,0 +1,45 @@
+# -*- coding: UTF-8 -*-
+import pytest
+
+from discovery import discover_latest_id
+
+
+class Probe:
+    """
+    按给定的ID集合回答探测，记录每次探测的窗口
+    """
+
+    def __init__(self, ids, fail_after=None):
+        self.ids = set(ids)
+        self.fail_after = fail_after
+        self.windows = []
+
+    def __call__(self, window):
+        if self.fail_after is not None and len(self.windows) >= self.fail_after:
+            raise RuntimeError('接口错误')
+        self.windows.append(window)
+        return [id_ for id_ in window if id_ in self.ids]
+
+
+@pytest.mark.parametrize('ids', [
+    range(1, 5001),
+    range(1, 5001, 7),  # 短于窗口的空洞
+    [id_ for id_ in range(1, 4990) if id_ % 100 >= 39] + [5020],  # 比窗口短一个ID的空洞，最大ID前也是空洞
+])
+def test_finds_latest_id_across_holes(ids):
+    probe = Probe(ids)
+    assert discover_latest_id(probe, 100, window=40) == max(ids)
+    assert len(probe.windows) < 30  # 倍增 + 二分，而不是逐窗口扫描
+    assert all(len(window) == 40 for window in probe.windows)
+
+
+def test_seed_at_or_past_the_end_is_kept():
+    probe = Probe(range(1, 500))
+    assert discover_latest_id(probe, 499) == 499
+    assert discover_latest_id(probe, 800) == 800
+    assert len(probe.windows) == 2  # 紧邻窗口为空即停止
+
+
+def test_probe_limit_and_errors_return_current_result():
+    assert discover_latest_id(Probe(range(1, 100000)), 1, max_probes=1) == 41
+    assert discover_latest_id(Probe(range(1, 100000), fail_after=1), 1) == 41
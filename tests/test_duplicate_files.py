@@ -0,0 +1,48 @@
+# -*- coding: UTF-8 -*-
+import os
+
+from catalogue import load_packages
+from conftest import make_package, write_packages
+from emoji_store import EmojiStore
+from merge_shards import merge_shards
+
+
+def renamed(id_: int, text: str) -> dict:
+    return dict(make_package(id_), text=text)
+
+
+def test_ambiguous_ids_are_skipped_not_guessed(tmp_path, capsys):
+    list_dir = tmp_path / 'list'
+    write_packages(list_dir, [make_package(1), renamed(2, '新名称'), renamed(2, '旧名称'), make_package(3)])
+
+    ambiguous = {}
+    assert [package['id'] for package in load_packages(str(list_dir), ambiguous)] == [1, 3]
+    assert ambiguous == {2: ['2-新名称.json', '2-旧名称.json']}
+    load_packages(str(list_dir))
+    assert '表情包ID 2 存在多个文件' in capsys.readouterr().out
+
+
+def test_import_and_export_keep_files_the_database_did_not_choose(tmp_path):
+    list_dir = tmp_path / 'list'
+    write_packages(list_dir, [make_package(1), renamed(2, '新名称'), renamed(2, '旧名称')])
+    before = {name: (list_dir / name).read_bytes() for name in os.listdir(list_dir)}
+
+    store = EmojiStore(str(tmp_path / 'emoji.sqlite'))
+    store.upsert(load_packages(str(list_dir)))
+    store.upsert([renamed(1, '改名')])  # 数据库中的名称与 list/ 不同
+    writer = store.export(str(list_dir))
+    store.close()
+
+    assert writer.counts == {'added': 1, 'changed': 0, 'unchanged': 0}
+    assert sorted(os.listdir(list_dir)) == sorted(list(before) + ['1-改名.json'])
+    assert all((list_dir / name).read_bytes() == data for name, data in before.items())
+
+
+def test_merge_reports_ambiguous_shard_ids_as_conflicts(tmp_path):
+    shard = tmp_path / 'partial' / '1-2'
+    write_packages(shard / 'list', [make_package(1), renamed(3, '新名称'), renamed(3, '旧名称')])
+    write_packages(tmp_path / 'list', [renamed(3, '原有')])
+
+    writer, conflicts = merge_shards([str(shard)], str(tmp_path / 'list'), str(tmp_path / 'scan_state.json'))
+    assert conflicts == {3: [str(shard)]}
+    assert sorted(os.listdir(tmp_path / 'list')) == ['1-表情包1.json', '3-原有.json']
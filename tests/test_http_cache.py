@@ -0,0 +1,17 @@
+# -*- coding: UTF-8 -*-
+import main
+
+BATCH = '/x/emote/package'
+
+
+def test_batch_endpoint_is_cached_per_id(scanner, monkeypatch):
+    monkeypatch.setenv('HTTP_CACHE', 'http_cache.sqlite')
+    emoji, api = scanner(main, 60, {'step': 40, 'end': 80})
+    emoji.main()
+    first = [record for record in api.records if record[0] == BATCH]
+
+    emoji, api = scanner(main, 60, {'step': 7, 'min_step': 7, 'max_step': 7, 'end': 80})  # 批量边界完全不同
+    emoji.main()
+    second = [record for record in api.records if record[0] == BATCH]
+    assert len(first) > 2
+    assert len(second) <= 2  # 只剩不使用缓存的最新ID探测，空ID也由缓存返回
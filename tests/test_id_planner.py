@@ -0,0 +1,72 @@
+# -*- coding: UTF-8 -*-
+import time
+
+from id_planner import IdPlanner, IntervalSet
+from scan_state import ScanState
+
+DAY = 86400
+
+
+def test_interval_set_from_config():
+    ignore = IntervalSet.from_config([4, [10, 12], '20-22', '30', [13, 15], 5])
+    assert list(zip(ignore.starts, ignore.ends)) == [(4, 5), (10, 15), (20, 22), (30, 30)]  # 相邻区间合并
+    assert len(ignore) == 2 + 6 + 3 + 1
+    assert 4 in ignore and 15 in ignore and 30 in ignore
+    assert 3 not in ignore and 16 not in ignore and 31 not in ignore
+
+
+def test_interval_set_add_merges_overlaps():
+    interval_set = IntervalSet.from_ids([1, 2, 3, 10, 20])
+    interval_set.add(4, 15)
+    assert list(zip(interval_set.starts, interval_set.ends)) == [(1, 15), (20, 20)]
+
+
+def test_interval_set_gaps():
+    ignore = IntervalSet.from_config(['3-5', 8, '12-20'])
+    assert list(ignore.gaps(1, 15)) == [1, 2, 6, 7, 9, 10, 11]
+    assert list(ignore.gaps(4, 10)) == [6, 7, 9]  # 起点落在区间内
+    assert list(ignore.gaps(13, 30)) == list(range(21, 30))
+    assert list(IntervalSet().gaps(1, 4)) == [1, 2, 3]
+    assert list(ignore.gaps(5, 5)) == []
+
+
+def test_plan_skips_ignored_and_dead_ids_and_orders_by_density(tmp_path):
+    state = ScanState(str(tmp_path / 'scan_state.json'))
+    for id_ in (1, 2, 12, 13, 14, 15):
+        state.record(id_, {'id': id_})
+    state.record_empty(3)
+    planner = IdPlanner(['5-9'], state, block=10)
+    assert planner.plan(1, 20) == [
+        16, 17, 18, 19,  # 超过已知最大ID的新区间在前
+        10, 11, 12, 13, 14, 15,  # 分块 10-19 更密集
+        1, 2, 4,  # 3 刚确认为空，5-9 被忽略
+    ]
+    assert IdPlanner(['5-9']).plan(1, 12) == [1, 2, 3, 4, 10, 11]  # 无扫描状态时只跳过忽略的ID
+
+
+def test_empty_id_back_off_starts_at_min_interval_and_grows(tmp_path, monkeypatch):
+    state = ScanState(str(tmp_path / 'scan_state.json'))
+    planner = IdPlanner([], state)
+    now = int(time.time())
+    state.record_empty(7)  # 首次建立索引（run 为 0）时确认为空
+    assert 7 in planner.dead_ranges(now)
+    assert 7 not in planner.dead_ranges(now + DAY)  # 一天后重新探测，而不是从 16 天开始
+
+    for probed, interval in ((now + DAY, DAY), (now + 2 * DAY, 2 * DAY), (now + 4 * DAY, 4 * DAY)):
+        monkeypatch.setattr(time, 'time', lambda: probed)
+        state.record_empty(7)  # 仍为空，间隔随持续为空的时间增长
+        assert 7 in planner.dead_ranges(probed + interval - 1)
+        assert 7 not in planner.dead_ranges(probed + interval)
+
+
+def test_legacy_empty_entries_are_reprobed_and_back_off(tmp_path, monkeypatch):
+    state = ScanState(str(tmp_path / 'scan_state.json'))
+    planner = IdPlanner([], state)
+    now = int(time.time())
+    state.ids[7] = [None, now, 0]  # 旧版本首次建立索引时记录的空ID
+    assert 7 not in planner.dead_ranges(now + DAY)
+
+    monkeypatch.setattr(time, 'time', lambda: now + DAY)
+    state.record_empty(7)
+    assert state.ids[7] == [None, now + DAY, now]
+    assert 7 in planner.dead_ranges(now + 2 * DAY - 1)
@@ -0,0 +1,37 @@
+# -*- coding: UTF-8 -*-
+import os
+
+import main_new
+from pipeline import Pipeline
+
+
+def test_parse_error_calls_back_with_id():
+    written, failed = [], []
+
+    def parse(raw):
+        if raw is None:
+            raise ValueError('无法解析')
+        return raw
+
+    pipeline = Pipeline(parse, written.extend, queue_size=4, on_parse_error=failed.append)
+    for id_, raw in ((1, {'id': 1}), (2, None), (3, {'id': 3})):
+        pipeline.put(id_, raw)
+    pipeline.close()
+    assert [id_ for id_, _ in written] == [1, 3]
+    assert failed == [2]
+
+
+def test_scan_retries_ids_that_failed_to_parse(scanner):
+    emoji, _ = scanner(main_new, 10, {})
+    parse, broken = emoji._parse_package, {4}
+
+    def flaky_parse(package):
+        if package['id'] in broken:
+            broken.discard(package['id'])  # 只失败一次
+            raise KeyError('emotes')
+        return parse(package)
+
+    emoji._parse_package = flaky_parse
+    emoji.main()
+    assert not broken
+    assert len(os.listdir('list')) == 10  # 解析失败的ID在运行结束前重试并保存
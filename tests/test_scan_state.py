@@ -0,0 +1,37 @@
+# -*- coding: UTF-8 -*-
+import time
+
+from scan_state import ScanState
+
+DAY = 86400
+
+
+def test_select_new_recent_and_rotating_ids(tmp_path):
+    state = ScanState(str(tmp_path / 'scan_state.json'))
+    for id_ in range(1, 21):
+        state.record(id_, {'id': id_})  # 首次建立索引，不视为近期变更
+    state.save()
+
+    state = ScanState(state.path)
+    assert state.run == 1
+    state.ids[7][2] = int(time.time()) - DAY  # 近期有变化
+    state.ids[9][2] = int(time.time()) - 5 * DAY
+    candidates = list(range(1, 30))
+    del state.ids[3]  # 从未获取过
+    assert state.select(candidates, rotation=4, recent_days=3) == [1, 3, 5, 7, 9, 13, 17] + list(range(21, 30))
+
+    state.run = 2  # 下一次运行轮转到下一个分片
+    assert state.select(candidates, rotation=4, recent_days=3) == [2, 3, 6, 7, 10, 14, 18] + list(range(21, 30))
+
+
+def test_record_reports_changes(tmp_path):
+    state = ScanState(str(tmp_path / 'scan_state.json'))
+    assert state.record(1, {'id': 1, 'text': 'a'})
+    assert state.ids[1][2] == 0
+    assert not state.record(1, {'id': 1, 'text': 'a'})
+    state.run = 1
+    assert state.record(1, {'id': 1, 'text': 'b'})
+    assert state.ids[1][2] == state.ids[1][1]
+    assert state.max_package_id() == 1
+    state.record_empty(1)
+    assert state.max_package_id() == 0
@@ -0,0 +1,64 @@
+# -*- coding: UTF-8 -*-
+import os
+
+import pytest
+
+from conftest import make_package, write_packages
+from merge_shards import merge_shards
+from scan_state import ScanState
+from sharding import ShardSpec
+
+
+def test_parse_and_filter():
+    assert ShardSpec.parse() is None
+    shard = ShardSpec.parse('3/4')
+    assert shard.filter(range(1, 13)) == [2, 6, 10]
+    assert shard.name == 'shard-3-of-4'
+
+    shard = ShardSpec.parse('2/3', '10-20')
+    assert shard.filter([19, 1, 4, 22, 10, 13, 25, 20]) == [19, 10, 13]  # 保持原有顺序
+    assert shard.name == 'shard-2-of-3-range-10-20'
+    assert ShardSpec.parse(id_range='5-7').filter(range(1, 10)) == [5, 6, 7]
+
+
+def test_shards_cover_every_id_once():
+    shards = [ShardSpec.parse(f'{k}/5') for k in range(1, 6)]
+    assert sorted(id_ for shard in shards for id_ in shard.filter(range(100))) == list(range(100))
+
+
+@pytest.mark.parametrize('shard', ['0/4', '5/4', '3', 'a/4'])
+def test_invalid_shard(shard):
+    with pytest.raises(ValueError):
+        ShardSpec.parse(shard)
+
+
+def shard_state(path, run, ids, listing=None) -> ScanState:
+    state = ScanState(str(path))
+    state.run = run
+    state.ids = ids
+    state.listing = listing or {}
+    return state
+
+
+def test_state_merge_keeps_newer_fetch(tmp_path):
+    state = shard_state(tmp_path / 'a.json', 3, {1: ['a', 100, 50], 2: ['b', 300, 300]}, {1: 'x1'})
+    state.merge(shard_state(tmp_path / 'b.json', 5, {1: ['c', 200, 200], 2: ['d', 200, 200], 3: [None, 200, 200]},
+                            {1: 'y1', 2: 'y2'}))
+    assert state.ids == {1: ['c', 200, 200], 2: ['b', 300, 300], 3: [None, 200, 200]}
+    assert state.listing == {1: 'y1', 2: 'y2'}
+    assert state.run == 4  # 分片保存时已计入本次运行
+
+
+def test_merge_conflicting_shards(tmp_path):
+    shards = [str(tmp_path / 'partial' / name) for name in ('shard-1-of-2', 'shard-2-of-2')]
+    changed = dict(make_package(3), text='另一个名称')
+    write_packages(os.path.join(shards[0], 'list'), [make_package(1), make_package(3)])
+    write_packages(os.path.join(shards[1], 'list'), [make_package(2), changed, make_package(1)])
+    shard_state(os.path.join(shards[0], 'scan_state.json'), 0, {1: ['a', 100, 0], 3: ['b', 100, 0]}).save()
+    shard_state(os.path.join(shards[1], 'scan_state.json'), 0, {2: ['c', 100, 0], 3: ['d', 200, 0]}).save()
+
+    writer, conflicts = merge_shards(shards, str(tmp_path / 'list'), str(tmp_path / 'scan_state.json'))
+    assert conflicts == {3: shards}  # 内容不同的ID不写入
+    assert sorted(os.listdir(tmp_path / 'list')) == ['1-表情包1.json', '2-表情包2.json']  # 内容相同的重复ID正常写入
+    state = ScanState(str(tmp_path / 'scan_state.json'))
+    assert state.run == 1 and state.ids == {1: ['a', 100, 0], 2: ['c', 100, 0], 3: ['d', 200, 0]}